@@ -1,25 +1,26 @@
 import pickle
 import pygame
-import re
 from os.path import join
-from os import listdir
 
 from game import Game
-from const import SCREEN_Y_SIZE, SCREEN_X_SIZE, GAME_TITLE, CLOCK_TICK,\
-    BIG_FONT, MID_FONT, STAR_SIZE, SMALL_FONT, colors
-from images import get_image
-from levels import generate_levels
+from const import SCREEN_Y_SIZE, SCREEN_X_SIZE, GAME_TITLE,\
+    BIG_FONT_SIZE, MID_FONT_SIZE, STAR_SIZE, SMALL_FONT_SIZE, colors, get_font
+from images import get_image, preload_images
+from levels import build_levels, level_count
+from replay import save_replay
 
 
 class GameMenu:
     def __init__(self):
-        generate_levels()
+        build_levels()
         pygame.init()
         self.screen = pygame.display.set_mode((SCREEN_X_SIZE, SCREEN_Y_SIZE))
         pygame.display.set_caption(GAME_TITLE)
+        preload_images('tiles', 'objects', 'hud', 'menu')
         self.icon = get_image(join('menu', 'logo-small.png'))
         pygame.display.set_icon(self.icon)
-        self.clock = pygame.time.Clock()
+        self.menu_frames = {}
+        self.background = None
         path = join('..', 'save')
         try:
             with open(path, 'rb') as file:
@@ -27,8 +28,7 @@ class GameMenu:
         except IOError:
             self.level_results = []
         self.level_selected = self.level_unlocked = len(self.level_results)
-        pattern = re.compile('^\d{4}\.level$')  # '4 digits'.level
-        self.total_levels = len([f for f in listdir(join('..', 'levels')) if pattern.match(f)])
+        self.total_levels = level_count()
         if self.total_levels == self.level_selected:  # All levels beaten
             self.level_selected -= 1
         self.entrance()
@@ -39,25 +39,22 @@ class GameMenu:
         white = colors['white']
         x = SCREEN_X_SIZE / 2
         logo = get_image(join('menu', 'logo-big.png'))
-        logo.convert_alpha()
         rect = logo.get_rect()
         rect.center = (x, 210)
         self.screen.blit(logo, rect)
-        text = MID_FONT.render("Press Enter to continue", True, white)
+        text = get_font(MID_FONT_SIZE).render("Press Enter to continue", True, white)
         rect = text.get_rect(center=(x, SCREEN_Y_SIZE - 50))
         self.screen.blit(text, rect)
         pygame.display.flip()
         while True:
-            events = pygame.event.get()
-            for event in events:
-                if event.type == pygame.QUIT:
+            event = pygame.event.wait()
+            if event.type == pygame.QUIT:
+                quit()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_q or event.key == pygame.K_ESCAPE:
                     quit()
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_q or event.key == pygame.K_ESCAPE:
-                        quit()
-                    if event.key == pygame.K_RETURN:
-                        return
-            self.clock.tick(CLOCK_TICK)
+                if event.key == pygame.K_RETURN:
+                    return
 
     def save(self):
         path = join('..', 'save')
@@ -65,8 +62,8 @@ class GameMenu:
             pickle.dump(self.level_results, file)
 
     def play_game(self):
-        game = Game(self.level_selected)  # Play level and get result
-        result = game.win_stars
+        game = Game(self.level_selected)
+        result = game.play()  # Play level and get result
         if result[0] == '*':
             if len(self.level_results) > self.level_selected:
                 # This wasn't the first time player has won this level
@@ -75,10 +72,12 @@ class GameMenu:
                     # only by collecting all three stars.
                     self.level_results[self.level_selected] = result
                     self.save()
+                    save_replay(game.replay, self.level_selected)
             else:
                 self.level_unlocked += 1
                 self.level_results.append(result)
                 self.save()
+                save_replay(game.replay, self.level_selected)
             return self.summary(result[1], result[2], game.level.steps)
         elif result[0] == 'retry':
             return 'retry'
@@ -95,7 +94,7 @@ class GameMenu:
         self.screen.fill(colors['blue'])
         x = SCREEN_X_SIZE / 2
         white = colors['white']
-        text = MID_FONT.render("Congratulations!", True, white)
+        text = get_font(MID_FONT_SIZE).render("Congratulations!", True, white)
         rect = text.get_rect(center=(x, 30))
         self.screen.blit(text, rect)
         y = SCREEN_Y_SIZE / 5
@@ -104,25 +103,25 @@ class GameMenu:
         text_y_delta = -5
         font_y_size = 45
         self.screen.blit(star_image, (stars_x, y))
-        text = MID_FONT.render("Push all balls into pads", True, white)
+        text = get_font(MID_FONT_SIZE).render("Push all balls into pads", True, white)
         self.screen.blit(text, (text_x, y + text_y_delta))
         y += font_y_size
         if diamonds_star == '*':
             self.screen.blit(star_image, (stars_x, y))
         else:
             self.screen.blit(no_star_image, (stars_x, y))
-        text = MID_FONT.render("Collect all diamonds", True, white)
+        text = get_font(MID_FONT_SIZE).render("Collect all diamonds", True, white)
         self.screen.blit(text, (text_x, y + text_y_delta))
         y += font_y_size
         if steps_star == '*':
             self.screen.blit(star_image, (stars_x, y))
         else:
             self.screen.blit(no_star_image, (stars_x, y))
-        text = MID_FONT.render("Finish in " + str(steps_amount) + " steps", True, white)
+        text = get_font(MID_FONT_SIZE).render("Finish in " + str(steps_amount) + " steps", True, white)
         self.screen.blit(text, (text_x, y + text_y_delta))
         x = SCREEN_X_SIZE / 4
         y = 3 * SCREEN_Y_SIZE / 4
-        text = SMALL_FONT.render("Q: go to main menu", True, white)
+        text = get_font(SMALL_FONT_SIZE).render("Q: go to main menu", True, white)
         rect = text.get_rect(center=(x, y))
         self.screen.blit(text, rect)
         button = get_image(join('menu', 'go_to_menu.png'))
@@ -130,7 +129,7 @@ class GameMenu:
         rect.centerx, rect.centery = x, y + font_y_size
         self.screen.blit(button, rect)
         x += SCREEN_X_SIZE / 4
-        text = SMALL_FONT.render("R: retry level", True, white)
+        text = get_font(SMALL_FONT_SIZE).render("R: retry level", True, white)
         rect = text.get_rect(center=(x, y))
         self.screen.blit(text, rect)
         button = get_image(join('menu', 'retry_level.png'))
@@ -138,7 +137,7 @@ class GameMenu:
         rect.centerx, rect.centery = x, y + font_y_size
         self.screen.blit(button, rect)
         x += SCREEN_X_SIZE / 4
-        text = SMALL_FONT.render("Enter: play next level", True, white)
+        text = get_font(SMALL_FONT_SIZE).render("Enter: play next level", True, white)
         rect = text.get_rect(center=(x, y))
         self.screen.blit(text, rect)
         button = get_image(join('menu', 'next_level.png'))
@@ -148,30 +147,28 @@ class GameMenu:
 
         pygame.display.flip()
         while True:
-            events = pygame.event.get()
-            for event in events:
-                if event.type == pygame.QUIT:
-                    quit()
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_q or event.key == pygame.K_ESCAPE:
-                        return 'menu'
-                    if event.key == pygame.K_r:
-                        return 'retry'
-                    if event.key == pygame.K_RETURN:
-                        return 'next'
-            self.clock.tick(CLOCK_TICK)
+            event = pygame.event.wait()
+            if event.type == pygame.QUIT:
+                quit()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_q or event.key == pygame.K_ESCAPE:
+                    return 'menu'
+                if event.key == pygame.K_r:
+                    return 'retry'
+                if event.key == pygame.K_RETURN:
+                    return 'next'
 
     def lose(self):
         font_y_size = 45
         self.screen.fill(colors['purple'])
         x = SCREEN_X_SIZE / 2
         white = colors['white']
-        text = MID_FONT.render("You died!", True, white)
+        text = get_font(MID_FONT_SIZE).render("You died!", True, white)
         rect = text.get_rect(center=(x, 30))
         self.screen.blit(text, rect)
         x = SCREEN_X_SIZE / 3
         y = 3 * SCREEN_Y_SIZE / 4
-        text = SMALL_FONT.render("Q: go to main menu", True, white)
+        text = get_font(SMALL_FONT_SIZE).render("Q: go to main menu", True, white)
         rect = text.get_rect(center=(x, y))
         self.screen.blit(text, rect)
         button = get_image(join('menu', 'go_to_menu.png'))
@@ -179,7 +176,7 @@ class GameMenu:
         rect.centerx, rect.centery = x, y + font_y_size
         self.screen.blit(button, rect)
         x += SCREEN_X_SIZE / 3
-        text = SMALL_FONT.render("R: retry level", True, white)
+        text = get_font(SMALL_FONT_SIZE).render("R: retry level", True, white)
         rect = text.get_rect(center=(x, y))
         self.screen.blit(text, rect)
         button = get_image(join('menu', 'retry_level.png'))
@@ -188,66 +185,77 @@ class GameMenu:
         self.screen.blit(button, rect)
         pygame.display.flip()
         while True:
-            events = pygame.event.get()
-            for event in events:
-                if event.type == pygame.QUIT:
-                    quit()
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_q or event.key == pygame.K_ESCAPE:
-                        return 'menu'
-                    if event.key == pygame.K_r:
-                        return 'retry'
-            self.clock.tick(CLOCK_TICK)
+            event = pygame.event.wait()
+            if event.type == pygame.QUIT:
+                quit()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_q or event.key == pygame.K_ESCAPE:
+                    return 'menu'
+                if event.key == pygame.K_r:
+                    return 'retry'
+
+    def menu_frame(self, level):
+        """
+        Pre-render menu screen for level once and reuse it.
+        :param level: Level number.
+        :return: Surface.
+        """
+        frame = self.menu_frames.get(level)
+        if frame is not None:
+            return frame
+        frame = self.background.copy()
+        text = get_font(BIG_FONT_SIZE).render(str(level + 1), True, colors['black'])
+        rect = text.get_rect(center=(SCREEN_X_SIZE / 2, SCREEN_Y_SIZE / 4))
+        frame.blit(text, rect)
+        try:
+            level_stars = self.level_results[level]
+        except IndexError:
+            level_stars = ['_', '_', '_']
+        star_image = get_image(join('menu', 'star.png'))
+        no_star_image = get_image(join('menu', 'no-star.png'))
+        for i in range(3):
+            if level_stars[i] == '*':
+                frame.blit(star_image, (SCREEN_X_SIZE / 2 + (i - 3 / 2) * STAR_SIZE, SCREEN_Y_SIZE / 2))
+            else:
+                frame.blit(no_star_image, (SCREEN_X_SIZE / 2 + (i - 3 / 2) * STAR_SIZE, SCREEN_Y_SIZE / 2))
+        self.menu_frames[level] = frame
+        return frame
 
     def main_loop(self):
         background = get_image(join('menu', 'landscape.png'))
-        background = pygame.transform.scale(background, (SCREEN_X_SIZE, SCREEN_Y_SIZE))
+        self.background = pygame.transform.scale(background, (SCREEN_X_SIZE, SCREEN_Y_SIZE))
         # Unlocked levels are 0, 1, ..., level_unlocked
         # Last level has number total_levels - 1
         while True:
-            events = pygame.event.get()
-            for event in events:
-                if event.type == pygame.QUIT:
+            # Screen is redrawn only after an event, menu waits for events without using CPU.
+            self.screen.blit(self.menu_frame(self.level_selected), (0, 0))
+            pygame.display.flip()
+            event = pygame.event.wait()
+            if event.type == pygame.QUIT:
+                quit()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_q or event.key == pygame.K_ESCAPE:
                     quit()
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_q or event.key == pygame.K_ESCAPE:
-                        quit()
-                    if event.key == pygame.K_LEFT or event.key == pygame.K_DOWN:
-                        if self.level_selected > 0:
-                            self.level_selected -= 1
-                    if event.key == pygame.K_RIGHT or event.key == pygame.K_UP:
-                        if self.level_selected < self.level_unlocked and self.level_selected < self.total_levels - 1:
+                if event.key == pygame.K_LEFT or event.key == pygame.K_DOWN:
+                    if self.level_selected > 0:
+                        self.level_selected -= 1
+                if event.key == pygame.K_RIGHT or event.key == pygame.K_UP:
+                    if self.level_selected < self.level_unlocked and self.level_selected < self.total_levels - 1:
+                        self.level_selected += 1
+                if event.key == pygame.K_PAGEUP:
+                    self.level_selected = min(self.level_selected + 5, self.level_unlocked, self.total_levels - 1)
+                if event.key == pygame.K_PAGEDOWN:
+                    self.level_selected = max(self.level_selected - 5, 0)
+                if event.key == pygame.K_RETURN:
+                    while True:
+                        # This loop is here only to prevent RuntimeError: maximum recursion depth exceeded,
+                        # since Python doesn't support tail recursion optimization.
+                        action = self.play_game()
+                        if action == 'menu':
+                            break
+                        elif action == 'next':
                             self.level_selected += 1
-                    if event.key == pygame.K_PAGEUP:
-                        self.level_selected = min(self.level_selected + 5, self.level_unlocked, self.total_levels - 1)
-                    if event.key == pygame.K_PAGEDOWN:
-                        self.level_selected = max(self.level_selected - 5, 0)
-                    if event.key == pygame.K_RETURN:
-                        while True:
-                            # This loop is here only to prevent RuntimeError: maximum recursion depth exceeded,
-                            # since Python doesn't support tail recursion optimization.
-                            action = self.play_game()
-                            if action == 'menu':
-                                break
-                            elif action == 'next':
-                                self.level_selected += 1
-            self.screen.blit(background, (0, 0))
-            text = BIG_FONT.render(str(self.level_selected + 1), True, colors['black'])
-            rect = text.get_rect(center=(SCREEN_X_SIZE / 2, SCREEN_Y_SIZE / 4))
-            self.screen.blit(text, rect)
-            try:
-                level_stars = self.level_results[self.level_selected]
-            except IndexError:
-                level_stars = ['_', '_', '_']
-            star_image = get_image(join('menu', 'star.png'))
-            no_star_image = get_image(join('menu', 'no-star.png'))
-            for i in range(3):
-                if level_stars[i] == '*':
-                    self.screen.blit(star_image, (SCREEN_X_SIZE / 2 + (i - 3 / 2) * STAR_SIZE, SCREEN_Y_SIZE / 2))
-                else:
-                    self.screen.blit(no_star_image, (SCREEN_X_SIZE / 2 + (i - 3 / 2) * STAR_SIZE, SCREEN_Y_SIZE / 2))
-            pygame.display.flip()
-            self.clock.tick(CLOCK_TICK)
+                    self.menu_frames.clear()  # Results could have changed.
 
 
 if __name__ == "__main__":
@@ -0,0 +1,33 @@
+class Animation:
+    """
+    Sprites displayed one after another, each for frame_duration frames.
+    Animation keeps no state, sprite is computed from game's frame counter,
+    so animated objects don't need to be updated.
+    """
+    def __init__(self, sprite_paths, frame_duration, loop=True):
+        """
+        :param sprite_paths: List of paths to sprites.
+        :param frame_duration: Amount of frames each sprite is displayed.
+        :param loop: Whether to start again after the last sprite (otherwise the last sprite stays).
+        """
+        self.sprite_paths = sprite_paths
+        self.frame_duration = frame_duration
+        self.loop = loop
+        self.duration = len(sprite_paths) * frame_duration
+
+    def sprite_path(self, frame, start=0):
+        """
+        :param frame: Current frame (game.frame).
+        :param start: Frame in which animation started.
+        :return: Path to sprite which should be displayed.
+        """
+        index = (frame - start) // self.frame_duration
+        if self.loop:
+            return self.sprite_paths[index % len(self.sprite_paths)]
+        return self.sprite_paths[min(index, len(self.sprite_paths) - 1)]
+
+    def is_over(self, frame, start=0):
+        """
+        :return: True if animation which doesn't loop has displayed all sprites.
+        """
+        return not self.loop and frame - start >= self.duration
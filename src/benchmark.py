@@ -0,0 +1,69 @@
+import argparse
+import json
+import os
+from os.path import join
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+import pygame
+
+from const import SCREEN_X_SIZE, SCREEN_Y_SIZE
+from game import Game
+from images import preload_images
+from levels import level_count
+from profiler import FrameProfiler
+from replay import Replay, load_replay
+
+
+def benchmark_level(number, frames):
+    """
+    Play level without frame limit, measuring every phase of frame. Inputs are
+    taken from saved replay (if there is one), otherwise player stands still.
+    :param number: Level number.
+    :param frames: Maximal amount of frames.
+    :return: Dictionary with results.
+    """
+    game = Game(number)
+    try:
+        replay = load_replay(number)
+    except IOError:
+        replay = Replay()
+    replay_frames = replay.frames()
+    game.profiler = FrameProfiler()
+    most_objects = 0
+    for _ in range(frames):
+        game.profiler.start()
+        game.step(next(replay_frames, ()))
+        game.messages.clear()
+        if game.is_won() or game.is_lost():
+            break
+        game.render()
+        pygame.display.flip()
+        game.profiler.mark('flip')
+        game.profiler.end()
+        # Projectiles are kept in their pool, not in layers of objects.
+        most_objects = max(most_objects, sum(len(layer) for layer in game.objects) + len(game.projectiles))
+    return {
+        'frames': game.frame,
+        'result': 'won' if game.is_won() else 'lost' if game.is_lost() else 'running',
+        'most_objects': most_objects,
+        'phases': game.profiler.summary(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure frame times of levels.")
+    parser.add_argument('levels', type=int, nargs='*', help="level numbers (starting from 1), all by default")
+    parser.add_argument('--frames', type=int, default=1200, help="maximal amount of frames per level")
+    parser.add_argument('--output', default=join('..', 'benchmark.json'), help="JSON file with results")
+    args = parser.parse_args()
+    pygame.init()
+    pygame.display.set_mode((SCREEN_X_SIZE, SCREEN_Y_SIZE))
+    preload_images('tiles', 'objects', 'hud')
+    results = {}
+    for level in args.levels or range(1, level_count() + 1):
+        results['%04d' % level] = benchmark_level(level - 1, args.frames)
+        frame = results['%04d' % level]['phases'].get('frame', {'mean': 0, 'p99': 0})
+        print("Level %d: %d frames, mean %.3f ms, p99 %.3f ms"
+              % (level, results['%04d' % level]['frames'], frame['mean'], frame['p99']))
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=1, sort_keys=True)
@@ -1,12 +1,18 @@
 import pygame
 from os.path import join
 
-pygame.font.init()
-SMALL_FONT = pygame.font.Font(join('..', 'fonts', 'open-sans.ttf'), 14)
-MID_FONT = pygame.font.Font(join('..', 'fonts', 'open-sans.ttf'), 36)
-BIG_FONT = pygame.font.Font(join('..', 'fonts', 'open-sans.ttf'), 144)
+DEFAULT_FONT_FACE = 'open-sans.ttf'
+SMALL_FONT_SIZE = 14
+MID_FONT_SIZE = 36
+BIG_FONT_SIZE = 144
 TILE_SIZE = 32
-CLOCK_TICK = 60
+CLOCK_TICK = 60  # Simulation ticks per second (it doesn't depend on frame rate)
+MAX_FRAME_RATE = 144
+MAX_TICKS_PER_FRAME = 5  # When rendering is too slow, game slows down rather than skipping more ticks
+# Positions are kept in fixed-point units. Amount of units in pixel is chosen so that
+# speeds used in levels (multiples of 1/6 tile per second) are whole units per tick.
+SUBPIXELS = 180
+TILE_UNITS = TILE_SIZE * SUBPIXELS
 # Preferred at least 20x15 in proportion 4:3
 SCREEN_X_TILES_LENGTH = 20
 SCREEN_Y_TILES_LENGTH = 15
@@ -20,6 +26,8 @@ HUD_Y_POSITION = 15
 HUD_BORDER_SIZE = 2
 HUD_BOX_SIZE = 34
 STAR_SIZE = 41
+PROFILER_WIDTH = 200
+PROFILER_BACKGROUND = (0, 0, 0, 160)
 GAME_TITLE = "RGBalls"
 
 colors = {
@@ -30,19 +38,31 @@ colors = {
     'black': (0, 0, 0),
 }
 
+__font_library = {}
 
-def lwr(x):
+
+def get_font(size, face=DEFAULT_FONT_FACE):
     """
-    Lambda wrapper.
+    Load font on first use, so modules importing const don't need fonts.
+    :param size: Size in points.
+    :param face: File in fonts directory.
+    :return: pygame.font.Font.
     """
-    return lambda *args, **kwargs: x
+    global __font_library
+    font = __font_library.get((face, size))
+    if font is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        font = pygame.font.Font(join('..', 'fonts', face), size)
+        __font_library[(face, size)] = font
+    return font
 
 
 def color_to_index(color):
     """
     Match color with its array index.
     :param color: 'red', 'green' or 'blue'.
-    :return: 0, 1 or 2.
+    :return: 0, 1 or 2. Raises ValueError for other colors.
     """
     if color == 'red':
         return 0
@@ -51,7 +71,7 @@ def color_to_index(color):
     elif color == 'blue':
         return 2
     else:
-        exit("Error in color_to_index function: \"" + color + "\" is not a color.")
+        raise ValueError("Error in color_to_index function: \"" + str(color) + "\" is not a color.")
 
 
 def in_render_range(x, y):
@@ -61,3 +81,11 @@ def in_render_range(x, y):
     :return: True or False.
     """
     return -TILE_SIZE < x < SCREEN_X_SIZE + TILE_SIZE and -TILE_SIZE < y < SCREEN_Y_SIZE + TILE_SIZE
+
+
+def units_per_tick(speed):
+    """
+    :param speed: Speed in tiles per second.
+    :return: Distance in fixed-point units covered in one simulation tick.
+    """
+    return int(round(TILE_UNITS * speed / CLOCK_TICK))
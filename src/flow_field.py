@@ -0,0 +1,68 @@
+from collections import deque
+
+from tiles import WALL
+
+
+class FlowField:
+    """
+    Distance of every tile to target tile (player), found by BFS over tiles
+    which are not walls. Field is shared by all chasing objects and computed
+    only when it is needed after target has changed its tile or terrain has changed.
+    """
+    def __init__(self, tiles_map):
+        """
+        :param tiles_map: TilesMap instance.
+        """
+        self.tiles_map = tiles_map
+        width = tiles_map.width
+        # Neighbours as (direction, change of cell index), horizontal ones first.
+        self.neighbours = (('left', -1), ('right', 1), ('up', -width), ('down', width))
+        self.distances = None  # Distance of every cell (-1 if target can't be reached)
+        self.target = None
+
+    def invalidate(self, x, y):
+        """
+        Called when tile changes (it is one of game.tile_listeners), whole field is computed again.
+        :param x, y: Coordinates of changed tile.
+        """
+        self.distances = None
+
+    def compute(self, target):
+        """
+        :param target: Coordinates (x, y) of target tile.
+        """
+        cells = self.tiles_map.cells
+        distances = [-1] * len(cells)
+        start = target[1] * self.tiles_map.width + target[0]
+        distances[start] = 0
+        queue = deque([start])
+        offsets = [offset for _, offset in self.neighbours]
+        while queue:
+            cell = queue.popleft()
+            distance = distances[cell] + 1
+            for offset in offsets:
+                neighbour = cell + offset
+                if distances[neighbour] == -1 and cells[neighbour] != WALL:
+                    distances[neighbour] = distance
+                    queue.append(neighbour)
+        self.distances = distances
+        self.target = target
+
+    def directions(self, x, y, target):
+        """
+        :param x, y: Coordinates.
+        :param target: Coordinates (x, y) of target tile.
+        :return: Directions of moves from (x, y) along shortest paths to target,
+                 the one along axis with larger distance to target first.
+        """
+        if self.distances is None or self.target != target:
+            self.compute(target)
+        cell = y * self.tiles_map.width + x
+        distance = self.distances[cell]
+        if distance <= 0:
+            return []  # Already there or target can't be reached.
+        directions = [direction for direction, offset in self.neighbours
+                      if self.distances[cell + offset] == distance - 1]
+        if len(directions) > 1 and abs(target[0] - x) < abs(target[1] - y):
+            directions.sort(key=lambda direction: direction in ('left', 'right'))
+        return directions
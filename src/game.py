@@ -1,11 +1,20 @@
 import pygame
+from heapq import heappush, heappop
 from os.path import join
 
 from images import get_image
 from levels import unpack_level
-from const import TILE_SIZE, CLOCK_TICK, color_to_index, PLAYER_X, PLAYER_Y, in_render_range
-from objects import Player, Ball, Diamond, Event
-from tiles import TilesManager
+from const import TILE_SIZE, CLOCK_TICK, MAX_FRAME_RATE, MAX_TICKS_PER_FRAME, color_to_index, PLAYER_X, PLAYER_Y, \
+    SCREEN_X_SIZE, SCREEN_Y_SIZE, MID_FONT_SIZE, SMALL_FONT_SIZE, colors, get_font, HUD_X_POSITION, HUD_Y_POSITION, \
+    HUD_BORDER_SIZE, PROFILER_WIDTH, PROFILER_BACKGROUND
+from inputs import ARROW_PRESSES, ARROW_RELEASES, KEY_DOWN_INPUTS, KEY_UP_INPUTS
+from flow_field import FlowField
+from objects import Player, Ball, Diamond, Cannonball, Event
+from profiler import FrameProfiler
+from projectiles import ProjectilePool
+from replay import Replay
+from tiles import TilesManager, TilesMap, TilesSurface, PADS, MAGNETIC_PADS
+from wrap_text import render_textrect, TextRectException
 
 
 class Game:
@@ -13,74 +22,213 @@ class Game:
         try:
             self.level = unpack_level(level_number)
         except FileNotFoundError:
+            self.level = None
             self.win_stars = ['level not found']
             return
         self.map_x_size = self.level.width + 2
         self.map_y_size = self.level.height + 2
-        self.tiles_map = [self.map_x_size * '#']
+        rows = [self.map_x_size * '#']
         for row in self.level.tiles:
-            self.tiles_map.append('#' + row + '#')
-        self.tiles_map.append(self.map_x_size * '#')
+            rows.append('#' + row + '#')
+        rows.append(self.map_x_size * '#')
+        self.tiles_map = TilesMap(rows)
         self.screen = pygame.display.get_surface()
         self.tiles_manager = TilesManager()
+        self.tiles_surface = TilesSurface(self.tiles_map, self.tiles_manager)
+        # Distances to player's tile, used by chasing enemies.
+        self.flow_field = FlowField(self.tiles_map)
+        # Functions called with (x, y) after any tile has been changed.
+        self.tile_listeners = [self.tiles_surface.invalidate, self.flow_field.invalidate]
         self.background_path = join('tiles', 'background.png')
         self.player = None
         self.holding_arrows = {
-            pygame.K_UP: False,
-            pygame.K_DOWN: False,
-            pygame.K_LEFT: False,
-            pygame.K_RIGHT: False
+            'up': False,
+            'down': False,
+            'left': False,
+            'right': False
         }
         # Objects' world has three layers. Most important layer is
         # layer 1 - almost all objects are there.
         self.objects = [{}, {}, {}]
+        # Live objects of every class, so queries by type don't need to scan all layers.
+        self.object_index = {}
+        # Objects which need to be updated, in every layer (dictionaries are used as ordered sets).
+        # Other objects sleep until they are woken up.
+        self.awake = [{}, {}, {}]
+        # Tiles reserved by moving objects (and Player) before they move there, in every layer: (x, y) -> owner.
+        # Every owner has at most one reserved tile, kept in self.claims.
+        self.reservations = [{}, {}, {}]
+        self.claims = {}
+        # Cannonballs are not kept in layers, all of them are moved at once.
+        self.projectiles = ProjectilePool()
         self.events = {}
         self.balls_left = [0, 0, 0]
         self.diamonds_left = 0
         self.foreground = []
+        # Messages waiting to be displayed by front end (i.e. read envelopes).
+        self.messages = []
+        self.frame = 0
+        # Scheduled calls, heap of (frame, order of scheduling, callback, arguments).
+        self.scheduled = []
+        self.scheduled_count = 0
+        # Rendered state is interpolated between previous and current tick: 0 - previous, 1 - current.
+        self.interpolation = 1
+        # Position of player on map in pixels (interpolated), everything is rendered relative to it.
+        self.camera_x, self.camera_y = 0, 0
+        # All inputs are recorded, so game can be replayed.
+        self.replay = Replay()
+        # Profiler keeps timings of last 2 * MAX_FRAME_RATE frames (at least two seconds, as frame rate is limited).
+        # It can be displayed by pressing P.
+        self.profiler = FrameProfiler(window=2 * MAX_FRAME_RATE, enabled=False)
         # Register objects
         for obj in self.level.objects:
             self.register_object(obj)
-        action = self.game_loop()
-        self.win_stars = ['_', '_', '_']
-        if action == 'win':
-            self.win_stars[0] = '*'  # First star is for winning game
-            if self.diamonds_left == 0:  # Second is for collecting all diamonds
-                self.win_stars[1] = '*'
-            if self.player.steps <= self.level.steps:  # Third is for finishing in enough steps
-                self.win_stars[2] = '*'
-        elif action == 'retry':
-            self.win_stars = ['retry']
-        elif action == 'lose':
-            self.win_stars = ['lose']
+        if self.player.init_function is not None:
+            self.player.init_function(self)
 
     def register_object(self, obj):
         if isinstance(obj, Player):
             self.player = obj
         elif isinstance(obj, Event):
             self.events[(obj.x, obj.y)] = obj
+        elif isinstance(obj, Cannonball):
+            self.projectiles.add(obj.x, obj.y, obj.in_move, obj.speed)
         else:
             if isinstance(obj, Ball):
-                if obj.color[0] == self.tiles_map[obj.y][obj.x].lower():
+                if self.tiles_map.get(obj.x, obj.y) in (PADS[obj.color], MAGNETIC_PADS[obj.color]):
                     obj.on_pad = True
                 else:
                     self.balls_left[color_to_index(obj.color)] += 1
             elif isinstance(obj, Diamond):
                 self.diamonds_left += 1
+            replaced = self.objects[obj.layer].get((obj.x, obj.y))
+            if replaced is not None:
+                self.remove_object(replaced)
             self.objects[obj.layer][(obj.x, obj.y)] = obj
+            self.object_index.setdefault(type(obj), set()).add(obj)
+            if obj.is_awake():
+                self.wake_object(obj)
+
+    def remove_object(self, obj):
+        """
+        Remove object from game. All objects should be removed through this function.
+        :param obj: Registered object.
+        """
+        layer = self.objects[obj.layer]
+        if layer.get((obj.x, obj.y)) is obj:
+            layer.pop((obj.x, obj.y))
+        if type(obj) in self.object_index:
+            self.object_index[type(obj)].discard(obj)
+        self.awake[obj.layer].pop(obj, None)
+        self.release_tile(obj)
+
+    def wake_object(self, obj):
+        """
+        Update object every frame, until it falls asleep (obj.is_awake() returns False).
+        :param obj: Object in one of layers.
+        """
+        self.awake[obj.layer][obj] = None
+
+    def claim_tile(self, x, y, owner):
+        """
+        Reserve tile in owner's layer, so nothing else moves there before owner arrives.
+        Previous reservation of owner is released. Removed objects can't reserve tiles.
+        :param x, y: Coordinates.
+        :param owner: Object which is going to move to the tile.
+        """
+        if owner is not self.player and owner not in self.object_index.get(type(owner), ()):
+            return
+        self.release_tile(owner)
+        self.reservations[owner.layer][(x, y)] = owner
+        self.claims[owner] = (x, y)
+
+    def release_tile(self, owner):
+        """
+        Release tile reserved by owner (if there is any).
+        :param owner: Object which has reserved a tile.
+        """
+        pos = self.claims.pop(owner, None)
+        if pos is not None:
+            self.reservations[owner.layer].pop(pos, None)
+
+    def occupant(self, x, y, layer):
+        """
+        Player's position is not checked, only objects in layers.
+        :param x, y: Coordinates.
+        :param layer: Layer (0, 1 or 2).
+        :return: Object in coordinates, object which has reserved them, projectiles (if there is one) or None.
+        """
+        pos = (x, y)
+        obj = self.objects[layer].get(pos)
+        if obj is None:
+            obj = self.reservations[layer].get(pos)
+            if obj is None and layer == self.projectiles.layer and pos in self.projectiles.occupied:
+                return self.projectiles
+        return obj
+
+    def schedule(self, delay, callback, *arguments):
+        """
+        Call callback with arguments after delay. Scheduled calls are made at
+        the beginning of step, in order of their frames (and of scheduling).
+        :param delay: Amount of frames (int) or seconds (float).
+        :param callback: Function.
+        """
+        if isinstance(delay, float):
+            delay = int(round(delay * CLOCK_TICK))
+        heappush(self.scheduled, (self.frame + delay, self.scheduled_count, callback, arguments))
+        self.scheduled_count += 1
+
+    def run_scheduled(self):
+        while self.scheduled and self.scheduled[0][0] <= self.frame:
+            _, _, callback, arguments = heappop(self.scheduled)
+            callback(*arguments)
+
+    def count_objects(self, object_type):
+        """
+        :param object_type: Class of objects (its subclasses are counted too).
+        :return: Amount of objects of type in game.
+        """
+        count = sum(len(objects) for cls, objects in self.object_index.items() if issubclass(cls, object_type))
+        if issubclass(Cannonball, object_type):
+            count += len(self.projectiles)
+        return count
+
+    def visible_tiles(self):
+        """
+        Compute window of tiles which can be seen on screen.
+        :return: (first_x, last_x, first_y, last_y) - ranges of tiles' coordinates (last ones excluded).
+        """
+        # Top left corner of the map on screen
+        origin_x = PLAYER_X - self.camera_x
+        origin_y = PLAYER_Y - self.camera_y
+        first_x = max(int(-origin_x // TILE_SIZE), 0)
+        first_y = max(int(-origin_y // TILE_SIZE), 0)
+        last_x = min(int((SCREEN_X_SIZE - origin_x) // TILE_SIZE) + 1, self.map_x_size)
+        last_y = min(int((SCREEN_Y_SIZE - origin_y) // TILE_SIZE) + 1, self.map_y_size)
+        return first_x, last_x, first_y, last_y
+
+    def set_tile(self, x, y, sign):
+        """
+        Change tile. All changes of tiles_map should be done through this function.
+        :param x, y: Coordinates.
+        :param sign: New tile.
+        """
+        self.tiles_map.set(x, y, sign)
+        for listener in self.tile_listeners:
+            listener(x, y)
 
     def render_tiles(self):
-        for i in range(self.map_x_size):
-            for j in range(self.map_y_size):
-                x = PLAYER_X + (i - self.player.x) * TILE_SIZE - self.player.in_move_delta_x
-                y = PLAYER_Y + (j - self.player.y) * TILE_SIZE - self.player.in_move_delta_y
-                if in_render_range(x, y):
-                    self.screen.blit(self.tiles_manager.get_tile(self.tiles_map[j][i]), (x, y))
+        first_x, last_x, first_y, last_y = self.visible_tiles()
+        x = PLAYER_X + first_x * TILE_SIZE - self.camera_x
+        y = PLAYER_Y + first_y * TILE_SIZE - self.camera_y
+        self.tiles_surface.render(self.screen, (x, y), first_x, last_x, first_y, last_y)
 
     def render_objects(self):
-        for layer in self.objects:
+        for i, layer in enumerate(self.objects):
             for obj in list(layer.values()):
                 obj.render(self)
+            if i == self.projectiles.layer:
+                self.projectiles.render(self)
 
     def render_foreground(self):
         """
@@ -96,12 +244,12 @@ class Game:
 
     def tile_is_free(self, x, y, layer):
         """
-        Check whether any object (including Player) is in coordinates.
+        Check whether any object (including Player) is in coordinates or has reserved them.
         :param x, y: Coordinates.
         :param layer: Layer (0, 1 or 2).
         :return: True or False.
         """
-        if (x, y) in self.objects[layer] or (self.player.x, self.player.y) == (x, y):
+        if self.occupant(x, y, layer) is not None or (self.player.x, self.player.y) == (x, y):
             return False
         return True
 
@@ -109,62 +257,217 @@ class Game:
         for key in self.holding_arrows.keys():
             self.holding_arrows[key] = False
 
-    def game_loop(self):
-        self.player.init_function(self)
+    # Simulation core. It doesn't need display nor event queue.
+
+    def handle_input(self, action):
+        """
+        :param action: One of inputs defined in inputs.py.
+        """
+        if action in ARROW_PRESSES:
+            self.holding_arrows[ARROW_PRESSES[action]] = True
+        elif action in ARROW_RELEASES:
+            self.holding_arrows[ARROW_RELEASES[action]] = False
+        elif action == 'switch_hud':
+            self.player.switch_hud()
+        elif action == 'previous_item':
+            self.player.select_previous_item()
+        elif action == 'next_item':
+            self.player.select_next_item()
+        elif action == 'use_item':
+            self.player.use_item(self)
+
+    def step(self, inputs=()):
+        """
+        Advance game by one frame.
+        :param inputs: Inputs received in this frame.
+        """
+        inputs = tuple(inputs)
+        self.replay.record(inputs)
+        for action in inputs:
+            self.handle_input(action)
+        self.run_scheduled()
+        if not self.player.in_move:
+            for direction in ('up', 'down', 'left', 'right'):
+                if self.holding_arrows[direction]:
+                    self.player.before_step(self, direction)
+                    break
+
+        self.player.update(self)
+        self.profiler.mark('player')
+        self.projectiles.update(self)
+        self.profiler.mark('projectiles')
+        for awake in self.awake:
+            for obj in list(awake):
+                if obj not in awake:
+                    continue  # Object has been removed by update of another object.
+                obj.update(self)
+                if not obj.is_awake():
+                    awake.pop(obj, None)
+        self.profiler.mark('update')
+        self.frame += 1
+
+    def is_won(self):
+        return self.balls_left == [0, 0, 0]
+
+    def is_lost(self):
+        return self.player.dead
+
+    def stats(self):
+        return {
+            'frames': self.frame,
+            'steps': self.player.steps,
+            'par_steps': self.level.steps,
+            'balls_left': list(self.balls_left),
+            'diamonds_left': self.diamonds_left,
+        }
+
+    # Front end.
+
+    def render(self):
+        self.camera_x, self.camera_y = self.player.render_position(self)
+        self.screen.fill((0, 0, 0))
+        self.render_tiles()
+        self.profiler.mark('tiles')
+        self.render_objects()
+        self.profiler.mark('objects')
+        self.player.render(self)
+        self.profiler.mark('hud')
+        self.render_foreground()
+        self.profiler.mark('foreground')
+
+    def render_profiler(self):
+        """
+        Display mean times of frame's phases and amount of objects in each layer.
+        """
+        lines = []
+        for phase in ('events', 'player', 'projectiles', 'update', 'tiles', 'objects', 'hud', 'foreground', 'overlay',
+                      'flip', 'frame'):
+            lines.append("%s: %.2f ms" % (phase, self.profiler.mean(phase)))
+        for i, layer in enumerate(self.objects):
+            counts = {}
+            for obj in layer.values():
+                name = type(obj).__name__
+                counts[name] = counts.get(name, 0) + 1
+            lines.append("Layer %d: %d objects, %d awake" % (i, len(layer), len(self.awake[i])))
+            for name in sorted(counts):
+                lines.append("    %s: %d" % (name, counts[name]))
+        lines.append("Projectiles: %d" % len(self.projectiles))
+        font = get_font(SMALL_FONT_SIZE)
+        line_height = font.get_linesize()
+        overlay = pygame.Surface((PROFILER_WIDTH, line_height * len(lines) + 2 * HUD_BORDER_SIZE), pygame.SRCALPHA)
+        overlay.fill(PROFILER_BACKGROUND)
+        for i, line in enumerate(lines):
+            text = font.render(line, True, colors['white'])
+            overlay.blit(text, (HUD_BORDER_SIZE, HUD_BORDER_SIZE + i * line_height))
+        self.screen.blit(overlay, (SCREEN_X_SIZE - PROFILER_WIDTH - HUD_X_POSITION, HUD_Y_POSITION))
+
+    def show_message(self, message):
+        """
+        Display message until player presses Enter.
+        :param message: Text.
+        """
+        clock = pygame.time.Clock()
+        rect = pygame.Rect(100, 100, SCREEN_X_SIZE - 200, SCREEN_Y_SIZE - 200)
+        try:
+            text = render_textrect(message, get_font(MID_FONT_SIZE), rect, colors['white'], colors['orange'], 0)
+        except TextRectException:
+            try:
+                text = render_textrect(message, get_font(SMALL_FONT_SIZE), rect, colors['white'], colors['orange'], 0)
+            except TextRectException:
+                text = render_textrect("Message is too long to be displayed.",
+                                       get_font(MID_FONT_SIZE), rect, colors['white'], colors['orange'], 0)
+        while True:
+            events = pygame.event.get()
+            for event in events:
+                if event.type == pygame.QUIT:
+                    quit(0)
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN:
+                    return
+            self.screen.blit(text, rect.topleft)
+            pygame.display.flip()
+            clock.tick(CLOCK_TICK)
+
+    def play(self, replay=None):
+        """
+        Play level in window.
+        :param replay: If given, inputs are taken from this Replay instead of keyboard.
+        :return: win_stars
+        """
+        if self.level is None:
+            return self.win_stars
+        action = self.game_loop(replay)
+        self.scheduled.clear()  # Nothing scheduled is called after level has been left.
+        self.win_stars = ['_', '_', '_']
+        if action == 'win':
+            self.win_stars[0] = '*'  # First star is for winning game
+            if self.diamonds_left == 0:  # Second is for collecting all diamonds
+                self.win_stars[1] = '*'
+            if self.player.steps <= self.level.steps:  # Third is for finishing in enough steps
+                self.win_stars[2] = '*'
+        elif action == 'retry':
+            self.win_stars = ['retry']
+        elif action == 'lose':
+            self.win_stars = ['lose']
+        return self.win_stars
+
+    def game_loop(self, replay=None):
+        """
+        Simulation is advanced by fixed ticks (CLOCK_TICK per second), independently of frame rate.
+        It runs ahead of real time by lag (less than one tick) and rendering is interpolated.
+        """
         clock = pygame.time.Clock()
+        replay_frames = replay.frames() if replay is not None else None
+        tick_time = 1000 / CLOCK_TICK  # Milliseconds
+        lag = tick_time
+        inputs = []  # Inputs received since last tick
         while True:
+            self.profiler.start()
             # Events
             events = pygame.event.get()
-            pressed = pygame.key.get_pressed()
             for event in events:
                 if event.type == pygame.QUIT:
                     quit(0)
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_q or event.key == pygame.K_ESCAPE:
                         return None
-                    if event.key == pygame.K_h:
-                        self.player.switch_hud()
-                    if event.key == pygame.K_z:
-                        self.player.select_previous_item()
-                    if event.key == pygame.K_x:
-                        self.player.select_next_item()
-                    if event.key == pygame.K_SPACE:
-                        self.player.use_item(self)
                     if event.key == pygame.K_r:
                         return 'retry'
-                    if event.key in self.holding_arrows.keys():
-                        self.holding_arrows[event.key] = True
+                    if event.key == pygame.K_p:
+                        self.profiler.enabled = not self.profiler.enabled
+                    if event.key in KEY_DOWN_INPUTS:
+                        inputs.append(KEY_DOWN_INPUTS[event.key])
                 if event.type == pygame.KEYUP:
-                    if event.key in self.holding_arrows.keys():
-                        self.holding_arrows[event.key] = False
-            if not self.player.in_move:
-                direction = False
-                if self.holding_arrows[pygame.K_UP]:
-                    direction = 'up'
-                elif self.holding_arrows[pygame.K_DOWN]:
-                    direction = 'down'
-                elif self.holding_arrows[pygame.K_LEFT]:
-                    direction = 'left'
-                elif self.holding_arrows[pygame.K_RIGHT]:
-                    direction = 'right'
-                if direction:
-                    self.player.before_step(self, direction)
+                    if event.key in KEY_UP_INPUTS:
+                        inputs.append(KEY_UP_INPUTS[event.key])
+            self.profiler.mark('events')
 
-            self.player.update(self)
-            for layer in self.objects:
-                for obj in list(layer.values()):
-                    obj.update(self)
+            while lag > 0:
+                if replay_frames is not None:
+                    inputs = next(replay_frames, None)
+                    if inputs is None:
+                        return None  # Replay is over.
+                self.step(inputs)
+                inputs = []
+                lag -= tick_time
+                if replay_frames is not None:
+                    self.messages.clear()  # Don't wait for player while replaying.
+                if self.messages:
+                    while self.messages:
+                        self.show_message(self.messages.pop(0))
+                    clock.tick()  # Time of reading messages is not caught up.
 
-            if self.balls_left == [0, 0, 0]:
-                return 'win'
-            if self.player.dead:
-                return 'lose'
+                if self.is_won():
+                    return 'win'
+                if self.is_lost():
+                    return 'lose'
+            self.interpolation = 1 + lag / tick_time
 
             # Render
-            self.screen.fill((0, 0, 0))
-            self.render_tiles()
-            self.render_objects()
-            self.player.render(self)
-            self.render_foreground()
+            self.render()
+            if self.profiler.enabled:
+                self.render_profiler()
+                self.profiler.mark('overlay')
             pygame.display.flip()
-            clock.tick(CLOCK_TICK)
+            self.profiler.mark('flip')
+            self.profiler.end()
+            lag = min(lag + clock.tick(MAX_FRAME_RATE), MAX_TICKS_PER_FRAME * tick_time)
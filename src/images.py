@@ -1,8 +1,26 @@
 import pygame
+from collections import OrderedDict
 from os.path import join
+from os import listdir
 
+# Most texts are fixed, but some change (e.g. steps), so only the latest ones are kept.
+TEXT_LIBRARY_SIZE = 64
 
 __image_library = {}
+__text_library = OrderedDict()
+
+
+def convert_image(image):
+    """
+    Convert image to pixel format of display, so it doesn't need to be converted on every blit.
+    :param image: Surface.
+    :return: Converted surface (or the same one, if there is no display yet).
+    """
+    if pygame.display.get_surface() is None:
+        return image
+    if image.get_flags() & pygame.SRCALPHA:
+        return image.convert_alpha()
+    return image.convert()
 
 
 def get_image(image_png):
@@ -10,6 +28,42 @@ def get_image(image_png):
     path = join('..', 'images', image_png)
     image = __image_library.get(path)
     if image is None:
-        image = pygame.image.load(path)
+        image = convert_image(pygame.image.load(path))
         __image_library[path] = image
     return image
+
+
+def preload_images(*directories):
+    """
+    Load all images from directories, so they don't need to be loaded in the middle of level.
+    Images loaded before display was created are converted now.
+    :param directories: Directories inside images directory.
+    """
+    global __image_library
+    for path in __image_library:
+        __image_library[path] = convert_image(__image_library[path])
+    for directory in directories:
+        for image_png in sorted(listdir(join('..', 'images', directory))):
+            if image_png.endswith('.png'):
+                get_image(join(directory, image_png))
+
+
+def get_text(text, font, color):
+    """
+    Render text once and reuse it later (while it is one of TEXT_LIBRARY_SIZE recently used texts).
+    :param text: String.
+    :param font: pygame.font.Font instance.
+    :param color: Color of text.
+    :return: Surface with rendered text.
+    """
+    global __text_library
+    key = (text, font, color)
+    surface = __text_library.get(key)
+    if surface is None:
+        surface = font.render(text, True, color)
+        __text_library[key] = surface
+        if len(__text_library) > TEXT_LIBRARY_SIZE:
+            __text_library.popitem(last=False)
+    else:
+        __text_library.move_to_end(key)
+    return surface
@@ -0,0 +1,34 @@
+import pygame
+
+# Inputs understood by Game.step. Arrows can be held, so pressing
+# and releasing them are separate inputs.
+ARROW_PRESSES = {
+    'press_up': 'up',
+    'press_down': 'down',
+    'press_left': 'left',
+    'press_right': 'right',
+}
+ARROW_RELEASES = {
+    'release_up': 'up',
+    'release_down': 'down',
+    'release_left': 'left',
+    'release_right': 'right',
+}
+
+# Keyboard bindings of inputs.
+KEY_DOWN_INPUTS = {
+    pygame.K_UP: 'press_up',
+    pygame.K_DOWN: 'press_down',
+    pygame.K_LEFT: 'press_left',
+    pygame.K_RIGHT: 'press_right',
+    pygame.K_h: 'switch_hud',
+    pygame.K_z: 'previous_item',
+    pygame.K_x: 'next_item',
+    pygame.K_SPACE: 'use_item',
+}
+KEY_UP_INPUTS = {
+    pygame.K_UP: 'release_up',
+    pygame.K_DOWN: 'release_down',
+    pygame.K_LEFT: 'release_left',
+    pygame.K_RIGHT: 'release_right',
+}
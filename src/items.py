@@ -3,7 +3,7 @@ from os.path import join
 
 from const import DEFAULT_LAYER
 from directions import position_after_moving, opposite_direction
-from objects import MockupObject, Cannonball
+from tiles import WALL, WATER
 
 
 class Item(ABC):
@@ -49,15 +49,13 @@ class Gun(Item):
     def on_use(self, game):
         direction = game.player.direction_facing
         pos = position_after_moving(game.player.x, game.player.y, direction)
-        if game.tiles_map[pos[1]][pos[0]] == '#':
+        if game.tiles_map.get(pos[0], pos[1]) == WALL:
             return False
-        collide = game.objects[DEFAULT_LAYER].get(pos)
-        if collide is not None and isinstance(collide, MockupObject):
-            collide = collide.owner
+        collide = game.occupant(pos[0], pos[1], DEFAULT_LAYER)
         if collide is not None:
             collide.on_hit(game, opposite_direction(direction))
         else:
-            game.register_object(Cannonball(pos[0], pos[1], direction, 8))
+            game.projectiles.add(pos[0], pos[1], direction, 8)
         return True
 
 
@@ -81,8 +79,7 @@ class LilyPlant(Item):
     def on_use(self, game):
         direction = game.player.direction_facing
         pos = position_after_moving(game.player.x, game.player.y, direction)
-        if game.tiles_map[pos[1]][pos[0]] == '_':
-            row = game.tiles_map[pos[1]]
-            game.tiles_map[pos[1]] = row[:pos[0]] + 'l' + row[pos[0] + 1:]
+        if game.tiles_map.get(pos[0], pos[1]) == WATER:
+            game.set_tile(pos[0], pos[1], 'l')
             return True
         return False
@@ -0,0 +1,330 @@
+import json
+import mmap
+import struct
+import zlib
+from copy import deepcopy
+
+from items import Gun, SpeedPill, LilyPlant
+from objects import GameObject, Player, Ball, Box, Diamond, Envelope, Portal, Cannonball, Cannon, Door, LittleDevil, \
+    Ghost, HellEntrance, Event
+
+# Only these classes can be created when loading a level.
+OBJECT_TYPES = {cls.__name__: cls for cls in (Player, Ball, Box, Diamond, Envelope, Portal, Cannonball, Cannon, Door,
+                                              LittleDevil, Ghost, HellEntrance, Event)}
+ITEM_TYPES = {cls.__name__: cls for cls in (Gun, SpeedPill, LilyPlant)}
+
+# Binary level: header, tiles (one byte per tile, row by row) and compressed JSON with objects.
+MAGIC = b'RGBL'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sBHHI')  # magic, version, width, height, steps
+# Pack of levels: header, index with one entry for each level and levels in binary form.
+PACK_MAGIC = b'RGBP'
+PACK_HEADER = struct.Struct('<4sBI20s')  # magic, version, amount of levels, hash of sources
+PACK_ENTRY = struct.Struct('<IIHHI20s')  # offset, size, width, height, steps, hash of level
+
+
+class LevelFormatError(Exception):
+    def __init__(self, message=None):
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+class Level:
+    def __init__(self, width, height, tiles, objects, steps):
+        self.width = width
+        self.height = height
+        self.tiles = tiles
+        self.objects = objects
+        self.steps = steps
+
+
+# Behaviours
+
+BEHAVIOURS = {}
+
+
+def register_behaviour(name):
+    """
+    Decorator registering function as behaviour under name.
+    """
+    def register(function):
+        BEHAVIOURS[name] = function
+        return function
+    return register
+
+
+class Behaviour:
+    """
+    Registered function with bound arguments. Levels use behaviours instead
+    of lambdas (for Player's init_function, Cannon's functions, Door's
+    conditions and Events), so they can be saved as plain data.
+    Registered function is called with tuple of call's arguments, followed
+    by bound arguments.
+    """
+    def __init__(self, name, *arguments):
+        if not isinstance(name, str) or name not in BEHAVIOURS:
+            raise LevelFormatError("Unknown behaviour '%s'." % name)
+        self.name = name
+        self.arguments = arguments
+        self.function = BEHAVIOURS[name]
+
+    def __call__(self, *arguments):
+        return self.function(arguments, *self.arguments)
+
+
+def check_for_existence(game, object_type):
+    """
+    Check whether there is a object of type in game.
+    :param game: Game.
+    :param object_type: Type of object.
+    :return: True or False.
+    """
+    return game.count_objects(object_type) != 0
+
+
+def flip_tiles(game, tiles, tile_1, tile_2):
+    """
+    For each (x, y) in tiles:
+        If tile at (x, y) is 'tile_1', change it to 'tile_2'.
+        Otherwise change it back to 'tile_1'.
+    :param game: Game.
+    :param tiles: List of coordinates.
+    :param tile_1, tile_2: Tiles to interchange between.
+    """
+    code_1 = ord(tile_1)
+    for x, y in tiles:
+        if game.tiles_map.get(x, y) == code_1:
+            game.set_tile(x, y, tile_2)
+        else:
+            game.set_tile(x, y, tile_1)
+
+
+@register_behaviour('constant')
+def constant(_, value):
+    return value
+
+
+@register_behaviour('first_then')
+def first_then(arguments, first, then):
+    """
+    Return first when called with 0, then otherwise (i.e. Cannon's delay before n-th shot).
+    """
+    return first if arguments[0] == 0 else then
+
+
+@register_behaviour('no_objects_left')
+def no_objects_left(arguments, type_name):
+    """
+    Called with game first (i.e. Door's condition).
+    """
+    return not check_for_existence(arguments[0], OBJECT_TYPES[type_name])
+
+
+@register_behaviour('flip_tiles')
+def flip_tiles_behaviour(arguments, tiles, tile_1, tile_2):
+    flip_tiles(arguments[0], tiles, tile_1, tile_2)
+
+
+@register_behaviour('register_objects')
+def register_objects(arguments, objects):
+    """
+    Register copies of objects, so behaviour can be called many times.
+    """
+    for obj in objects:
+        arguments[0].register_object(deepcopy(obj))
+
+
+@register_behaviour('add_item')
+def add_item(arguments, item_name, amount=1):
+    arguments[0].player.add_item(ITEM_TYPES[item_name](), amount)
+
+
+@register_behaviour('sequence')
+def sequence(arguments, behaviours):
+    for behaviour in behaviours:
+        behaviour(*arguments)
+
+
+@register_behaviour('delayed')
+def delayed(arguments, delay, behaviour):
+    """
+    Called with game first. Delay is in frames (int) or seconds (float), see Game.schedule.
+    """
+    arguments[0].schedule(delay, behaviour, *arguments)
+
+
+# Encoding
+
+def encode_value(value):
+    """
+    Convert value to JSON compatible data. Objects and behaviours are
+    saved as dictionaries with their names (under '$object' or
+    '$behaviour') and arguments.
+    """
+    if isinstance(value, Behaviour):
+        return {'$behaviour': value.name, 'arguments': [encode_value(v) for v in value.arguments]}
+    if isinstance(value, (GameObject, Event)):
+        return {'$object': type(value).__name__, 'arguments': [encode_value(v) for v in value.arguments()]}
+    if isinstance(value, dict):
+        if any(not isinstance(key, str) or key.startswith('$') for key in value):
+            raise LevelFormatError("Keys of dictionary %r can't be saved in level." % (value,))
+        return {key: encode_value(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(v) for v in value]
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    raise LevelFormatError("Value %r can't be saved in level." % (value,))
+
+
+def decode_record(data):
+    """
+    Used as object_hook of json.loads, so it gets every dictionary with
+    values already decoded. Only registered objects and behaviours are created,
+    wrong arguments of their constructors are reported as LevelFormatError.
+    """
+    if '$behaviour' in data:
+        return Behaviour(data['$behaviour'], *data.get('arguments', []))
+    if '$object' in data:
+        if data['$object'] not in OBJECT_TYPES:
+            raise LevelFormatError("Unknown object %r." % data['$object'])
+        try:
+            return OBJECT_TYPES[data['$object']](*data.get('arguments', []))
+        except (TypeError, ValueError, KeyError) as error:
+            raise LevelFormatError("Wrong arguments of %s: %s" % (data['$object'], error))
+    return data
+
+
+def level_to_json(level):
+    """
+    :param level: Level instance.
+    :return: Readable JSON text, used for authoring levels.
+    """
+    return json.dumps({
+        'width': level.width,
+        'height': level.height,
+        'tiles': list(level.tiles),
+        'objects': encode_value(level.objects),
+        'steps': level.steps,
+    }, indent=1)
+
+
+def level_from_json(text):
+    """
+    :return: Level instance.
+    """
+    try:
+        data = json.loads(text, object_hook=decode_record)
+        level = Level(data['width'], data['height'], data['tiles'], data['objects'], data['steps'])
+    except (ValueError, KeyError) as error:
+        raise LevelFormatError("Invalid level: %s" % error)
+    check_tiles(level)
+    return level
+
+
+def level_to_bytes(level):
+    """
+    :param level: Level instance.
+    :return: Compact binary form of level, used for shipping levels.
+    """
+    check_tiles(level)
+    objects = json.dumps(encode_value(level.objects), separators=(',', ':')).encode()
+    return HEADER.pack(MAGIC, FORMAT_VERSION, level.width, level.height, level.steps) + \
+        ''.join(level.tiles).encode('ascii') + zlib.compress(objects)
+
+
+def level_from_bytes(data):
+    """
+    :return: Level instance.
+    """
+    if len(data) < HEADER.size:
+        raise LevelFormatError("Level is too short.")
+    magic, version, width, height, steps = HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise LevelFormatError("Not a level of version %d." % FORMAT_VERSION)
+    tiles_end = HEADER.size + width * height
+    if len(data) < tiles_end:
+        raise LevelFormatError("Level is too short.")
+    try:
+        tiles = data[HEADER.size:tiles_end].decode('ascii')
+        objects = json.loads(zlib.decompress(data[tiles_end:]).decode(), object_hook=decode_record)
+    except (zlib.error, ValueError) as error:
+        raise LevelFormatError("Invalid level: %s" % error)
+    return Level(width, height, [tiles[y * width:(y + 1) * width] for y in range(height)], objects, steps)
+
+
+def check_tiles(level):
+    if len(level.tiles) != level.height or any(len(row) != level.width for row in level.tiles):
+        raise LevelFormatError("Tiles are not rectangle of size %d x %d." % (level.width, level.height))
+
+
+# Pack
+
+def levels_to_pack(levels_data, hashes, sources_hash):
+    """
+    :param levels_data: Levels in binary form.
+    :param hashes: Hash (hexadecimal SHA-1) of every level.
+    :param sources_hash: Hash of sources levels were built from.
+    :return: Pack of all levels.
+    """
+    header = PACK_HEADER.pack(PACK_MAGIC, FORMAT_VERSION, len(levels_data), bytes.fromhex(sources_hash))
+    offset = PACK_HEADER.size + PACK_ENTRY.size * len(levels_data)
+    index = []
+    for data, level_hash in zip(levels_data, hashes):
+        _, _, width, height, steps = HEADER.unpack_from(data)
+        index.append(PACK_ENTRY.pack(offset, len(data), width, height, steps, bytes.fromhex(level_hash)))
+        offset += len(data)
+    return b''.join([header] + index + list(levels_data))
+
+
+class LevelPack:
+    """
+    Pack of levels mapped to memory. Only header is read on opening,
+    everything else is read when needed.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            try:
+                self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise LevelFormatError("Pack is empty.")
+        if len(self.data) < PACK_HEADER.size:
+            raise LevelFormatError("Pack is too short.")
+        magic, version, self.count, sources_hash = PACK_HEADER.unpack_from(self.data)
+        if magic != PACK_MAGIC or version != FORMAT_VERSION:
+            raise LevelFormatError("Not a pack of version %d." % FORMAT_VERSION)
+        if len(self.data) < PACK_HEADER.size + PACK_ENTRY.size * self.count:
+            raise LevelFormatError("Pack is too short.")
+        self.sources_hash = sources_hash.hex()
+
+    def __len__(self):
+        return self.count
+
+    def entry(self, number):
+        if not 0 <= number < self.count:
+            raise IndexError("There is no level %d in pack." % number)
+        return PACK_ENTRY.unpack_from(self.data, PACK_HEADER.size + PACK_ENTRY.size * number)
+
+    def info(self, number):
+        """
+        :return: Dictionary with 'width', 'height', 'steps' and 'hash' of level.
+        """
+        _, _, width, height, steps, level_hash = self.entry(number)
+        return {'width': width, 'height': height, 'steps': steps, 'hash': level_hash.hex()}
+
+    def level_data(self, number):
+        """
+        :return: Level in binary form.
+        """
+        offset, size = self.entry(number)[:2]
+        return self.data[offset:offset + size]
+
+    def level(self, number):
+        """
+        :return: Level instance.
+        """
+        return level_from_bytes(self.level_data(number))
+
+    def close(self):
+        self.data.close()
@@ -1,75 +1,177 @@
-from os.path import join, exists
-from os import makedirs
-from threading import Timer
-import dill
+import ast
+from hashlib import sha1
+from os.path import join, exists, dirname, abspath
+from os import makedirs, replace, listdir, remove
 
-from const import lwr
-from items import LilyPlant, Gun
+from level_format import Level, Behaviour, LevelPack, LevelFormatError, level_to_bytes, level_to_json, \
+    levels_to_pack
 from objects import Player, Ball, Box, Diamond, Portal, Cannon, Envelope, Door, LittleDevil, Event, Cannonball, Ghost, \
     HellEntrance
 
 
-class Level:
-    def __init__(self, width, height, tiles, objects, steps):
-        self.width = width
-        self.height = height
-        self.tiles = tiles
-        self.objects = objects
-        self.steps = steps
+__pack = None
+
+
+def pack_path():
+    return join('..', 'levels', 'levels.pack')
+
+
+def open_pack():
+    """
+    :return: LevelPack, opened once and shared.
+    """
+    global __pack
+    if __pack is None:
+        __pack = LevelPack(pack_path())
+    return __pack
+
+
+def close_pack():
+    global __pack
+    if __pack is not None:
+        __pack.close()
+        __pack = None
 
 
 def unpack_level(number):
-    level_name = "%04d.level" % number
-    path = join('..', 'levels', level_name)
-    with open(path, 'rb') as file:
-        return dill.load(file)
+    """
+    :return: Level instance. Raises FileNotFoundError if there is no such level.
+    """
+    try:
+        return open_pack().level(number)
+    except IndexError:
+        raise FileNotFoundError("There is no level %d." % number)
 
 
-def pack_level(level, number):
-    level_name = "%04d.level" % number
-    path = join('..', 'levels', level_name)
-    with open(path, 'wb') as file:
-        dill.dump(level, file)
+def level_count():
+    return len(open_pack())
 
 
-# Auxiliary functions
+# Incremental build
 
-def check_for_existence(game, object_type):
+# Packed levels refer to classes from these modules, so changing them rebuilds all levels.
+ENGINE_MODULES = ('objects.py', 'items.py', 'const.py', 'level_format.py')
+LEVELS_MODULE = 'levels.py'
+
+
+def read_source(name):
+    with open(join(dirname(abspath(__file__)), name), 'r') as file:
+        return file.read()
+
+
+def sources_hash():
+    """
+    Cheap check done on every launch: hash of this file and engine modules.
     """
-    Check whether there is a object of type in game.
-    :param game: Game.
-    :param object_type: Type of object.
-    :return: True or False.
+    content = ''.join(read_source(name) for name in (LEVELS_MODULE,) + ENGINE_MODULES)
+    return sha1(content.encode()).hexdigest()
+
+
+def parse_levels():
+    """
+    Find every Level(...) in level_definitions. They can be found only
+    if the function just returns list of them.
+    :return: (source of this file, node of level_definitions, list of nodes of levels or None if they can't be found).
     """
-    for layer in game.objects:
-        for obj in layer.values():
-            if isinstance(obj, object_type):
-                return True
-    return False
+    source = read_source(LEVELS_MODULE)
+    tree = ast.parse(source)
+    definitions = next(node for node in tree.body
+                       if isinstance(node, ast.FunctionDef) and node.name == 'level_definitions')
+    body = definitions.body
+    if (len(body) == 1 and isinstance(body[0], ast.Return) and isinstance(body[0].value, ast.List) and
+            all(isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'Level'
+                for node in body[0].value.elts)):
+        return source, definitions, body[0].value.elts
+    return source, definitions, None
 
 
-def flip_tiles(game, tiles, tile_1, tile_2):
+def level_hashes(parsed=None):
     """
-    For each (x, y) in tiles:
-        If tile at (x, y) is 'tile_1', change it to 'tile_2'.
-        Otherwise change it back to 'tile_1'.
-    :param game: Game.
-    :param tiles: List of coordinates.
-    :param tile_1, tile_2: Tiles to interchange between.
+    Hash source code of every Level(...) in level_definitions. Everything
+    else in this file (helper functions used by levels) and engine modules
+    is hashed together and mixed into every level's hash. If levels can't
+    be found in level_definitions, whole function is mixed into every hash,
+    so any change of it packs all levels again.
+    :param parsed: Result of parse_levels (it is called if not given).
+    :return: List of hashes, one for each level.
     """
-    for x, y in tiles:
-        if game.tiles_map[y][x] == tile_1:
-            row = game.tiles_map[y]
-            game.tiles_map[y] = row[:x] + tile_2 + row[x + 1:]
-        else:
-            row = game.tiles_map[y]
-            game.tiles_map[y] = row[:x] + tile_1 + row[x + 1:]
+    source, definitions, nodes = parsed if parsed is not None else parse_levels()
+    function = ast.get_source_segment(source, definitions)
+    common = source.replace(function, '')
+    common += ''.join(read_source(name) for name in ENGINE_MODULES)
+    common_hash = sha1(common.encode()).hexdigest()
+    if nodes is None:
+        function_hash = sha1((common_hash + function).encode()).hexdigest()
+        return [sha1((function_hash + str(i)).encode()).hexdigest() for i in range(len(level_definitions()))]
+    segments = [ast.get_source_segment(source, node) for node in nodes]
+    return [sha1((common_hash + segment).encode()).hexdigest() for segment in segments]
+
+
+def build_level(node):
+    """
+    Create one level from level_definitions, without creating the others.
+    :param node: Node of Level(...) found by parse_levels.
+    :return: Level instance.
+    """
+    return eval(compile(ast.Expression(node), LEVELS_MODULE, 'eval'), globals())
+
+
+def remove_old_files(path):
+    """
+    Levels used to be saved one per file (NNNN.level) with manifest.json, they are replaced by the pack.
+    :param path: Directory of levels.
+    """
+    for name in listdir(path):
+        if name == 'manifest.json' or (name.endswith('.level') and name[:-len('.level')].isdigit()):
+            remove(join(path, name))
+
+
+def build_levels(force=False):
+    """
+    Build pack of levels. Levels whose source hasn't changed since last
+    build are copied from old pack, the rest is packed again.
+    :param force: Pack all levels.
+    :return: Amount of packed levels.
+    """
+    path = join('..', 'levels')
+    if not exists(path):
+        makedirs(path)
+    current_sources = sources_hash()
+    old_levels = {}
+    if not force:
+        try:
+            pack = open_pack()
+        except (IOError, LevelFormatError):
+            pack = None
+        if pack is not None:
+            if pack.sources_hash == current_sources:
+                return 0
+            old_levels = {pack.info(i)['hash']: pack.level_data(i) for i in range(len(pack))}
+    parsed = parse_levels()
+    hashes = level_hashes(parsed)
+    changed = [i for i in range(len(hashes)) if hashes[i] not in old_levels]
+    nodes = parsed[2]
+    if nodes is None and len(changed) != 0:
+        levels = level_definitions()
+        for i in changed:
+            old_levels[hashes[i]] = level_to_bytes(levels[i])
+    else:
+        # Only changed levels are created and encoded, the others are copied from old pack.
+        for i in changed:
+            old_levels[hashes[i]] = level_to_bytes(build_level(nodes[i]))
+    data = levels_to_pack([old_levels[level_hash] for level_hash in hashes], hashes, current_sources)
+    close_pack()
+    remove_old_files(path)
+    with open(pack_path() + '.tmp', 'wb') as file:
+        file.write(data)
+    replace(pack_path() + '.tmp', pack_path())
+    return len(changed)
 
 
 # Levels' data
 
-def generate_levels():
-    levels = [
+def level_definitions():
+    return [
         Level(6, 3,
             [
                 '...l_r',
@@ -113,7 +215,6 @@ def generate_levels():
                 '#####.#.',
                 '......#.',
                 '........',
-                '########'
             ], [
                 Player(1, 8),
                 Ball(8, 2, 'red'),
@@ -173,7 +274,6 @@ def generate_levels():
                 'g....',
                 '#####',
                 'b....',
-                '#####'
             ], [
                 Player(1, 1),
                 Ball(2, 3, 'red'),
@@ -331,9 +431,9 @@ def generate_levels():
                 Diamond(7, 6),
                 Diamond(3, 8),
                 Diamond(7, 10),
-                Cannon(4, 2, 'down', lwr(60), lwr(11)),
-                Cannon(5, 2, 'down', lwr(60), lwr(11)),
-                Cannon(6, 2, 'down', lwr(60), lwr(11)),
+                Cannon(4, 2, 'down', Behaviour('constant', 60), Behaviour('constant', 11)),
+                Cannon(5, 2, 'down', Behaviour('constant', 60), Behaviour('constant', 11)),
+                Cannon(6, 2, 'down', Behaviour('constant', 60), Behaviour('constant', 11)),
             ], 44
         ), Level(30, 7,
             [
@@ -348,32 +448,32 @@ def generate_levels():
                 Player(1, 1),
                 Ball(2, 5, 'red'),
                 Portal(1, 7, 30, 1),
-                Cannon(3, 1, 'down', lwr(100), lwr(5)),
-                Cannon(4, 1, 'down', lwr(100), lwr(5)),
-                Cannon(5, 1, 'down', lwr(100), lwr(5)),
-                Cannon(6, 1, 'down', lwr(100), lwr(5)),
-                Cannon(7, 1, 'down', lwr(100), lwr(5)),
-                Cannon(8, 1, 'down', lwr(100), lwr(5)),
-                Cannon(9, 1, 'down', lwr(100), lwr(5)),
-                Cannon(10, 1, 'down', lwr(100), lwr(5)),
-                Cannon(11, 1, 'down', lwr(100), lwr(5)),
-                Cannon(12, 1, 'down', lwr(100), lwr(5)),
-                Cannon(13, 1, 'down', lwr(100), lwr(5)),
-                Cannon(14, 1, 'down', lwr(100), lwr(5)),
-                Cannon(15, 1, 'down', lwr(100), lwr(5)),
-                Cannon(16, 1, 'down', lwr(100), lwr(5)),
-                Cannon(17, 1, 'down', lwr(100), lwr(5)),
-                Cannon(18, 1, 'down', lwr(100), lwr(5)),
-                Cannon(19, 1, 'down', lwr(100), lwr(5)),
-                Cannon(20, 1, 'down', lwr(100), lwr(5)),
-                Cannon(21, 1, 'down', lwr(100), lwr(5)),
-                Cannon(22, 1, 'down', lwr(100), lwr(5)),
-                Cannon(23, 1, 'down', lwr(100), lwr(5)),
-                Cannon(24, 1, 'down', lwr(100), lwr(5)),
-                Cannon(25, 1, 'down', lwr(100), lwr(5)),
-                Cannon(26, 1, 'down', lwr(100), lwr(5)),
-                Cannon(27, 1, 'down', lwr(100), lwr(5)),
-                Cannon(28, 1, 'down', lwr(100), lwr(5)),
+                Cannon(3, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(4, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(5, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(6, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(7, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(8, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(9, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(10, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(11, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(12, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(13, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(14, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(15, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(16, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(17, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(18, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(19, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(20, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(21, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(22, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(23, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(24, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(25, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(26, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(27, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
+                Cannon(28, 1, 'down', Behaviour('constant', 100), Behaviour('constant', 5)),
             ], 25
         ), Level(9, 9,
             [
@@ -454,12 +554,12 @@ def generate_levels():
                 Diamond(22, 10),
                 Diamond(22, 16),
                 Diamond(22, 22),
-                Cannon(1, 7, 'right', lwr(45), lwr(8)),
-                Cannon(1, 13, 'right', lwr(45), lwr(8)),
-                Cannon(1, 19, 'right', lwr(45), lwr(8)),
-                Cannon(7, 1, 'down', lambda x: 70 if x == 0 else 45, lwr(8)),
-                Cannon(13, 1, 'down', lambda x: 70 if x == 0 else 45, lwr(8)),
-                Cannon(19, 1, 'down', lambda x: 70 if x == 0 else 45, lwr(8)),
+                Cannon(1, 7, 'right', Behaviour('constant', 45), Behaviour('constant', 8)),
+                Cannon(1, 13, 'right', Behaviour('constant', 45), Behaviour('constant', 8)),
+                Cannon(1, 19, 'right', Behaviour('constant', 45), Behaviour('constant', 8)),
+                Cannon(7, 1, 'down', Behaviour('first_then', 70, 45), Behaviour('constant', 8)),
+                Cannon(13, 1, 'down', Behaviour('first_then', 70, 45), Behaviour('constant', 8)),
+                Cannon(19, 1, 'down', Behaviour('first_then', 70, 45), Behaviour('constant', 8)),
             ], 350
         ), Level(10, 10,
             [
@@ -550,26 +650,26 @@ def generate_levels():
             ], [
                 Player(1, 1),
                 Ball(14, 7, 'red'),
-                Cannon(1, 5, 'right', lambda x: 50 if x == 0 else 150, lwr(4)),
-                Cannon(1, 6, 'right', lambda x: 100 if x == 0 else 150, lwr(4)),
-                Cannon(1, 7, 'right', lwr(150), lwr(4)),
-                Cannon(1, 8, 'right', lambda x: 50 if x == 0 else 150, lwr(4)),
-                Cannon(1, 9, 'right', lambda x: 100 if x == 0 else 150, lwr(4)),
-                Cannon(13, 5, 'left', lambda x: 100 if x == 0 else 150, lwr(4)),
-                Cannon(13, 6, 'left', lwr(150), lwr(4)),
-                Cannon(13, 7, 'left', lambda x: 50 if x == 0 else 150, lwr(4)),
-                Cannon(13, 8, 'left', lambda x: 100 if x == 0 else 150, lwr(4)),
-                Cannon(13, 9, 'left', lwr(150), lwr(4)),
-                Cannon(5, 1, 'down', lwr(150), lwr(4)),
-                Cannon(6, 1, 'down', lambda x: 50 if x == 0 else 150, lwr(4)),
-                Cannon(7, 1, 'down', lambda x: 100 if x == 0 else 150, lwr(4)),
-                Cannon(8, 1, 'down', lwr(150), lwr(4)),
-                Cannon(9, 1, 'down', lambda x: 50 if x == 0 else 150, lwr(4)),
-                Cannon(5, 13, 'up', lwr(150), lwr(4)),
-                Cannon(6, 13, 'up', lambda x: 100 if x == 0 else 150, lwr(4)),
-                Cannon(7, 13, 'up', lambda x: 50 if x == 0 else 150, lwr(4)),
-                Cannon(8, 13, 'up', lwr(150), lwr(4)),
-                Cannon(9, 13, 'up', lambda x: 100 if x == 0 else 150, lwr(4)),
+                Cannon(1, 5, 'right', Behaviour('first_then', 50, 150), Behaviour('constant', 4)),
+                Cannon(1, 6, 'right', Behaviour('first_then', 100, 150), Behaviour('constant', 4)),
+                Cannon(1, 7, 'right', Behaviour('constant', 150), Behaviour('constant', 4)),
+                Cannon(1, 8, 'right', Behaviour('first_then', 50, 150), Behaviour('constant', 4)),
+                Cannon(1, 9, 'right', Behaviour('first_then', 100, 150), Behaviour('constant', 4)),
+                Cannon(13, 5, 'left', Behaviour('first_then', 100, 150), Behaviour('constant', 4)),
+                Cannon(13, 6, 'left', Behaviour('constant', 150), Behaviour('constant', 4)),
+                Cannon(13, 7, 'left', Behaviour('first_then', 50, 150), Behaviour('constant', 4)),
+                Cannon(13, 8, 'left', Behaviour('first_then', 100, 150), Behaviour('constant', 4)),
+                Cannon(13, 9, 'left', Behaviour('constant', 150), Behaviour('constant', 4)),
+                Cannon(5, 1, 'down', Behaviour('constant', 150), Behaviour('constant', 4)),
+                Cannon(6, 1, 'down', Behaviour('first_then', 50, 150), Behaviour('constant', 4)),
+                Cannon(7, 1, 'down', Behaviour('first_then', 100, 150), Behaviour('constant', 4)),
+                Cannon(8, 1, 'down', Behaviour('constant', 150), Behaviour('constant', 4)),
+                Cannon(9, 1, 'down', Behaviour('first_then', 50, 150), Behaviour('constant', 4)),
+                Cannon(5, 13, 'up', Behaviour('constant', 150), Behaviour('constant', 4)),
+                Cannon(6, 13, 'up', Behaviour('first_then', 100, 150), Behaviour('constant', 4)),
+                Cannon(7, 13, 'up', Behaviour('first_then', 50, 150), Behaviour('constant', 4)),
+                Cannon(8, 13, 'up', Behaviour('constant', 150), Behaviour('constant', 4)),
+                Cannon(9, 13, 'up', Behaviour('first_then', 100, 150), Behaviour('constant', 4)),
                 Diamond(5, 5),
                 Diamond(5, 6),
                 Diamond(5, 7),
@@ -620,7 +720,7 @@ def generate_levels():
                 Box(6, 3),
                 Box(6, 2),
                 Door(7, 5, {
-                    'condition_on_update': lambda x, _: not check_for_existence(x, Box)
+                    'condition_on_update': Behaviour('no_objects_left', 'Box')
                 })
             ], 64
         ), Level(10, 10,
@@ -702,12 +802,12 @@ def generate_levels():
                 Envelope(2, 1, "Destroy all little devils! Make use of cannons."),
                 Ball(12, 11, 'red'),
                 Door(12, 10, {
-                    'condition_on_update': lambda x, _: not check_for_existence(x, LittleDevil)
+                    'condition_on_update': Behaviour('no_objects_left', 'LittleDevil')
                 }),
-                Cannon(6, 12, 'up', lwr(120), lwr(12)),
-                Cannon(7, 12, 'up', lwr(120), lwr(12)),
-                Cannon(12, 6, 'left', lambda x: 60 if x == 0 else 120, lwr(12)),
-                Cannon(12, 7, 'left', lambda x: 60 if x == 0 else 120, lwr(12)),
+                Cannon(6, 12, 'up', Behaviour('constant', 120), Behaviour('constant', 12)),
+                Cannon(7, 12, 'up', Behaviour('constant', 120), Behaviour('constant', 12)),
+                Cannon(12, 6, 'left', Behaviour('first_then', 60, 120), Behaviour('constant', 12)),
+                Cannon(12, 7, 'left', Behaviour('first_then', 60, 120), Behaviour('constant', 12)),
                 LittleDevil(12, 1, 4, 1),
                 LittleDevil(1, 12, 4, 1),
                 LittleDevil(6, 6, 4, 1)
@@ -749,14 +849,14 @@ def generate_levels():
                 LittleDevil(19, 12, 6, 1),
                 LittleDevil(19, 17, 6, 1),
                 Ball(23, 2, 'blue'),
-                Cannon(1, 7, 'right', lwr(45), lwr(8)),
-                Cannon(1, 13, 'right', lwr(45), lwr(8)),
-                Cannon(1, 19, 'right', lwr(45), lwr(8)),
-                Cannon(7, 1, 'down', lambda x: 70 if x == 0 else 45, lwr(8)),
-                Cannon(13, 1, 'down', lambda x: 70 if x == 0 else 45, lwr(8)),
-                Cannon(19, 1, 'down', lambda x: 70 if x == 0 else 45, lwr(8)),
+                Cannon(1, 7, 'right', Behaviour('constant', 45), Behaviour('constant', 8)),
+                Cannon(1, 13, 'right', Behaviour('constant', 45), Behaviour('constant', 8)),
+                Cannon(1, 19, 'right', Behaviour('constant', 45), Behaviour('constant', 8)),
+                Cannon(7, 1, 'down', Behaviour('first_then', 70, 45), Behaviour('constant', 8)),
+                Cannon(13, 1, 'down', Behaviour('first_then', 70, 45), Behaviour('constant', 8)),
+                Cannon(19, 1, 'down', Behaviour('first_then', 70, 45), Behaviour('constant', 8)),
                 Door(24, 3, {
-                    'condition_on_update': lambda x, _: not check_for_existence(x, LittleDevil)
+                    'condition_on_update': Behaviour('no_objects_left', 'LittleDevil')
                 }),
             ], 100
         ), Level(12, 12,
@@ -776,14 +876,14 @@ def generate_levels():
             ], [
                 Player(4, 9),
                 Ball(11, 2, 'green'),
-                Event(2, 7, lambda game, _: flip_tiles(game, [(10, 4), (10, 6), (10, 7)], '_', 'l'), 0),
-                Event(4, 7, lambda game, _: flip_tiles(game, [(10, 2), (10, 3), (10, 4)], '_', 'l'), 0),
-                Event(6, 7, lambda game, _: flip_tiles(game, [(10, 1), (10, 6), (10, 8)], '_', 'l'), 0),
-                Event(2, 9, lambda game, _: flip_tiles(game, [(10, 5), (10, 9), (10, 10)], '_', 'l'), 0),
-                Event(6, 9, lambda game, _: flip_tiles(game, [(10, 2), (10, 3), (10, 6)], '_', 'l'), 0),
-                Event(2, 11, lambda game, _: flip_tiles(game, [(10, 1), (10, 4), (10, 9)], '_', 'l'), 0),
-                Event(4, 11, lambda game, _: flip_tiles(game, [(10, 2), (10, 3)], '_', 'l'), 0),
-                Event(6, 11, lambda game, _: flip_tiles(game, [(10, 1), (10, 8)], '_', 'l'), 0),
+                Event(2, 7, Behaviour('flip_tiles', [(10, 4), (10, 6), (10, 7)], '_', 'l'), 0),
+                Event(4, 7, Behaviour('flip_tiles', [(10, 2), (10, 3), (10, 4)], '_', 'l'), 0),
+                Event(6, 7, Behaviour('flip_tiles', [(10, 1), (10, 6), (10, 8)], '_', 'l'), 0),
+                Event(2, 9, Behaviour('flip_tiles', [(10, 5), (10, 9), (10, 10)], '_', 'l'), 0),
+                Event(6, 9, Behaviour('flip_tiles', [(10, 2), (10, 3), (10, 6)], '_', 'l'), 0),
+                Event(2, 11, Behaviour('flip_tiles', [(10, 1), (10, 4), (10, 9)], '_', 'l'), 0),
+                Event(4, 11, Behaviour('flip_tiles', [(10, 2), (10, 3)], '_', 'l'), 0),
+                Event(6, 11, Behaviour('flip_tiles', [(10, 1), (10, 8)], '_', 'l'), 0),
             ], 50
         ), Level(9, 55,
             [
@@ -846,59 +946,73 @@ def generate_levels():
                 Player(5, 55),
                 Envelope(5, 54, "Watch out for traps!"),
                 Ball(5, 8, 'green'),
-                Cannon(1, 52, 'right', lwr(40), lwr(12)),
-                Event(5, 50, lambda game, _: game.register_object(Cannonball(2, 49, 'right', 12))),
-                Event(5, 47, lambda game, _: (
-                    game.register_object(Cannonball(2, 47, 'right', 12)),
-                    game.register_object(Cannonball(2, 46, 'right', 12))
-                )),
-                Event(5, 41, lambda game, _: (
-                    game.register_object(Cannonball(2, 41, 'right', 12)),
-                    game.register_object(Cannonball(2, 42, 'right', 12))
-                )),
-                Event(5, 38, lambda game, _: (
-                    game.register_object(Cannonball(8, 37, 'left', 12)),
-                    game.register_object(Cannonball(8, 39, 'left', 12)),
-                    Timer(0.3, game.register_object, [Cannonball(8, 39, 'left', 12)]).start(),
-                    Timer(0.3, game.register_object, [Cannonball(8, 38, 'left', 12)]).start(),
-                    Timer(0.3, game.register_object, [Cannonball(8, 36, 'left', 12)]).start(),
-                    Timer(0.6, game.register_object, [Cannonball(8, 36, 'left', 12)]).start(),
-                    Timer(0.6, game.register_object, [Cannonball(8, 37, 'left', 12)]).start(),
-                )),
-                Event(5, 29, lambda game, _: (
-                    game.register_object(Diamond(5, 34)),
-                    game.register_object(Event(5, 32, lambda _, __: (
-                        game.register_object(Cannonball(8, 33, 'left', 12)),
-                        game.register_object(Cannonball(2, 31, 'right', 12)),
-                    ), 0))
-                )),
-                Cannon(1, 28, 'right', lwr(40), lwr(12)),
-                Cannon(9, 27, 'left', lwr(45), lwr(12)),
-                Event(5, 23, lambda game, _: (
-                    game.register_object(Cannonball(2, 22, 'right', 12)),
-                    game.register_object(Cannonball(8, 24, 'left', 12))
-                )),
-                Event(5, 20, lambda game, _: game.register_object(Cannonball(5, 13, 'down', 12))),
-                Event(5, 17, lambda game, _: (
-                    game.register_object(Cannonball(8, 16, 'left', 12)),
-                    game.register_object(Cannonball(2, 18, 'right', 12))
-                )),
-                Event(5, 11, lambda game, _: (
-                    game.register_object(Cannonball(8, 10, 'left', 12)),
-                    Timer(0.3, game.register_object, [Cannonball(8, 10, 'left', 12)]).start(),
-                    Timer(0.3, game.register_object, [Cannonball(2, 12, 'right', 12)]).start(),
-                    Timer(0.6, game.register_object, [Cannonball(8, 10, 'left', 12)]).start(),
-                    Timer(0.6, game.register_object, [Cannonball(2, 12, 'right', 12)]).start(),
-                    Timer(0.9, game.register_object, [Cannonball(8, 10, 'left', 12)]).start(),
-                    Timer(0.9, game.register_object, [Cannonball(2, 12, 'right', 12)]).start(),
-                    Timer(1.2, game.register_object, [Cannonball(8, 10, 'left', 12)]).start(),
-                    Timer(1.2, game.register_object, [Cannonball(2, 11, 'right', 12)]).start(),
-                )),
-                Event(5, 8, lambda game, _: (
-                    game.register_object(Cannonball(2, 7, 'right', 12)),
-                    game.register_object(Cannonball(2, 8, 'right', 12)),
-                    game.register_object(Cannonball(2, 9, 'right', 12)),
-                ))
+                Cannon(1, 52, 'right', Behaviour('constant', 40), Behaviour('constant', 12)),
+                Event(5, 50, Behaviour('register_objects', [Cannonball(2, 49, 'right', 12)])),
+                Event(5, 47, Behaviour('register_objects', [
+                    Cannonball(2, 47, 'right', 12),
+                    Cannonball(2, 46, 'right', 12),
+                ])),
+                Event(5, 41, Behaviour('register_objects', [
+                    Cannonball(2, 41, 'right', 12),
+                    Cannonball(2, 42, 'right', 12),
+                ])),
+                Event(5, 38, Behaviour('sequence', [
+                    Behaviour('register_objects', [
+                        Cannonball(8, 37, 'left', 12),
+                        Cannonball(8, 39, 'left', 12),
+                    ]),
+                    Behaviour('delayed', 0.3, Behaviour('register_objects', [
+                        Cannonball(8, 39, 'left', 12),
+                        Cannonball(8, 38, 'left', 12),
+                        Cannonball(8, 36, 'left', 12),
+                    ])),
+                    Behaviour('delayed', 0.6, Behaviour('register_objects', [
+                        Cannonball(8, 36, 'left', 12),
+                        Cannonball(8, 37, 'left', 12),
+                    ])),
+                ])),
+                Event(5, 29, Behaviour('register_objects', [
+                    Diamond(5, 34),
+                    Event(5, 32, Behaviour('register_objects', [
+                        Cannonball(8, 33, 'left', 12),
+                        Cannonball(2, 31, 'right', 12),
+                    ]), 0),
+                ])),
+                Cannon(1, 28, 'right', Behaviour('constant', 40), Behaviour('constant', 12)),
+                Cannon(9, 27, 'left', Behaviour('constant', 45), Behaviour('constant', 12)),
+                Event(5, 23, Behaviour('register_objects', [
+                    Cannonball(2, 22, 'right', 12),
+                    Cannonball(8, 24, 'left', 12),
+                ])),
+                Event(5, 20, Behaviour('register_objects', [Cannonball(5, 13, 'down', 12)])),
+                Event(5, 17, Behaviour('register_objects', [
+                    Cannonball(8, 16, 'left', 12),
+                    Cannonball(2, 18, 'right', 12),
+                ])),
+                Event(5, 11, Behaviour('sequence', [
+                    Behaviour('register_objects', [Cannonball(8, 10, 'left', 12)]),
+                    Behaviour('delayed', 0.3, Behaviour('register_objects', [
+                        Cannonball(8, 10, 'left', 12),
+                        Cannonball(2, 12, 'right', 12),
+                    ])),
+                    Behaviour('delayed', 0.6, Behaviour('register_objects', [
+                        Cannonball(8, 10, 'left', 12),
+                        Cannonball(2, 12, 'right', 12),
+                    ])),
+                    Behaviour('delayed', 0.9, Behaviour('register_objects', [
+                        Cannonball(8, 10, 'left', 12),
+                        Cannonball(2, 12, 'right', 12),
+                    ])),
+                    Behaviour('delayed', 1.2, Behaviour('register_objects', [
+                        Cannonball(8, 10, 'left', 12),
+                        Cannonball(2, 11, 'right', 12),
+                    ])),
+                ])),
+                Event(5, 8, Behaviour('register_objects', [
+                    Cannonball(2, 7, 'right', 12),
+                    Cannonball(2, 8, 'right', 12),
+                    Cannonball(2, 9, 'right', 12),
+                ])),
             ], 75
         ), Level(7, 7,
             [
@@ -910,7 +1024,7 @@ def generate_levels():
                 '.._._..',
                 'r._._.g',
             ], [
-                Player(1, 4, lambda game: game.player.add_item(LilyPlant(), 3)),
+                Player(1, 4, Behaviour('add_item', 'LilyPlant', 3)),
                 Ball(2, 2, 'green'),
                 Ball(6, 2, 'red'),
                 Ghost(1, 1, 7, [(7, 1), (7, 7), (1, 7)]),
@@ -970,11 +1084,11 @@ def generate_levels():
             ], [
                 Ball(45, 2, 'red'),
                 Envelope(3, 43, "Prepare for invasion! Be careful though, you can't shoot while moving."),
-                Player(1, 45, lambda game: (
-                    game.player.add_item(Gun(), 99),
-                    Timer(10.0, flip_tiles, (game, [(1, 41), (2, 41), (3, 41), (4, 41), (5, 41),
-                                                   (5, 42), (5, 43), (5, 44), (5, 45)], '#', '.')).start()
-                )),
+                Player(1, 45, Behaviour('sequence', [
+                    Behaviour('add_item', 'Gun', 99),
+                    Behaviour('delayed', 10.0, Behaviour('flip_tiles', [(1, 41), (2, 41), (3, 41), (4, 41), (5, 41),
+                                                                        (5, 42), (5, 43), (5, 44), (5, 45)], '#', '.')),
+                ])),
                 HellEntrance(2, 1, 460, 1.5),
                 HellEntrance(5, 1, 460, 1.5),
                 HellEntrance(8, 1, 775, 2.5),
@@ -1011,8 +1125,21 @@ def generate_levels():
             ], 400
         ),
     ]
-    path = join('..', 'levels')
-    if not exists(path):
-        makedirs(path)
-    for i in range(len(levels)):
-        pack_level(levels[i], i)
+
+
+if __name__ == "__main__":
+    import argparse
+    # Levels need to be packed with functions of module levels, not __main__.
+    from levels import build_levels as build
+
+    parser = argparse.ArgumentParser(description="Pack levels changed since last build.")
+    parser.add_argument('--force', action='store_true', help="pack all levels")
+    parser.add_argument('--json', metavar='DIRECTORY', help="also save levels as JSON into directory")
+    args = parser.parse_args()
+    print("Packed %d levels." % build(args.force))
+    if args.json is not None:
+        if not exists(args.json):
+            makedirs(args.json)
+        for i, level in enumerate(level_definitions()):
+            with open(join(args.json, "%04d.json" % i), 'w') as file:
+                file.write(level_to_json(level))
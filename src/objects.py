@@ -1,10 +1,10 @@
-from sys import exit
 from abc import ABC
 from bisect import bisect_left
 
-from wrap_text import render_textrect, TextRectException
+from animation import Animation
 from directions import position_after_moving, assert_direction, opposite_direction
-from images import get_image
+from images import get_image, get_text
+from tiles import WALL, WATER, SAND, LILY, UNIVERSAL_PAD, UNIVERSAL_MAGNETIC_PAD, PADS, MAGNETIC_PADS, ANY_MAGNETIC_PAD
 from const import *
 
 
@@ -15,6 +15,12 @@ class Event:
         self.event = event
         self.miscellaneous = miscellaneous
 
+    def arguments(self):
+        """
+        :return: Arguments of constructor creating this event (used to save levels).
+        """
+        return [self.x, self.y, self.event, self.times_triggered, self.miscellaneous]
+
     def trigger(self, game):
         self.event(game, self)
         self.times_triggered -= 1
@@ -23,6 +29,10 @@ class Event:
 
 
 class GameObject(ABC):
+    # Objects have no __dict__, every subclass lists its own attributes in __slots__.
+    __slots__ = ('sprite_path', 'x', 'y', 'miscellaneous')
+    layer = DEFAULT_LAYER  # Default layer for all objects
+
     def __init__(self, x, y, miscellaneous=None):
         """
         Create object in place (x, y).
@@ -32,8 +42,19 @@ class GameObject(ABC):
         self.x, self.y = x, y
         # Miscellaneous can be used to keep any additional info that you might use outside of this object.
         self.miscellaneous = miscellaneous
-        # Default layer for all objects
-        self.layer = DEFAULT_LAYER
+
+    def arguments(self):
+        """
+        :return: Arguments of constructor creating this object (used to save levels).
+        """
+        return [self.x, self.y, self.miscellaneous]
+
+    def is_awake(self):
+        """
+        Objects which are not awake are not updated until they are woken up by game.wake_object.
+        :return: True if update needs to be called in next frame.
+        """
+        return True
 
     def before_step(self, game, direction):
         """
@@ -80,41 +101,19 @@ class GameObject(ABC):
         :param game: Game instance.
         """
         if self.sprite_path is not None:
-            x = PLAYER_X + (self.x - game.player.x) * TILE_SIZE - game.player.in_move_delta_x
-            y = PLAYER_Y + (self.y - game.player.y) * TILE_SIZE - game.player.in_move_delta_y
+            x = PLAYER_X + self.x * TILE_SIZE - game.camera_x
+            y = PLAYER_Y + self.y * TILE_SIZE - game.camera_y
             if in_render_range(x, y):
                 game.screen.blit(get_image(self.sprite_path), (x, y))
 
 
-class MockupObject(GameObject):
-    """
-    This invisible object is created to protect from moving two objects
-    to the same place by reserving it. This object should not be created
-    on its own (i.e. in levels.py).
-    """
-    def __init__(self, x, y, game, owner):
-        super().__init__(x, y)
-        self.owner = owner
-        game.objects[self.layer][(x, y)] = self
-        self.game = game
-        self.time_to_live = 150
-
-    def update(self, _):
-        """
-        This is a band-aid fix in case some mockup objects don't get cleared.
-        """
-        self.time_to_live -= 1
-        if self.time_to_live == 0:
-            self.destroy()
-
-    def destroy(self):
-        self.game.objects[self.layer].pop((self.x, self.y))
-
-
 class MovingObject(GameObject, ABC):
     """
     Base class for moving objects.
     """
+    __slots__ = ('speed', 'step_size', 'in_move', 'in_move_delta_x', 'in_move_delta_y', 'previous_position',
+                 'previous_frame')
+
     def __init__(self, x, y, speed, miscellaneous=None):
         """
         Create an object. It will move with given speed.
@@ -122,110 +121,158 @@ class MovingObject(GameObject, ABC):
         :param speed: Speed in tiles per second.
         """
         super().__init__(x, y, miscellaneous)
-        self.step_size = TILE_SIZE * speed / CLOCK_TICK
+        self.speed = speed
+        self.step_size = units_per_tick(speed)
         self.in_move = False  # Either False or direction of move.
+        # Distance moved from (x, y) in fixed-point units (TILE_UNITS in one tile).
         self.in_move_delta_x = 0
         self.in_move_delta_y = 0
+        # Position in previous tick, so rendering can be interpolated between ticks.
+        self.previous_position = None
+        self.previous_frame = None
 
     def modify_speed(self, delta):
         """
         Modify speed of object.
         :param delta: Value added to speed of object.
         """
-        self.step_size += TILE_SIZE * delta / CLOCK_TICK
+        self.speed += delta
+        self.step_size = units_per_tick(self.speed)
+
+    def position(self):
+        """
+        :return: Position on map in fixed-point units.
+        """
+        return self.x * TILE_UNITS + self.in_move_delta_x, self.y * TILE_UNITS + self.in_move_delta_y
+
+    def remember_position(self, game):
+        """
+        Call at the beginning of update, before object moves.
+        :param game: Game instance.
+        """
+        self.previous_position = self.position()
+        self.previous_frame = game.frame
+
+    def render_position(self, game):
+        """
+        :param game: Game instance.
+        :return: Position on map in pixels, interpolated between previous and current tick.
+        """
+        x, y = self.position()
+        if self.previous_frame == game.frame - 1:
+            previous_x, previous_y = self.previous_position
+            x = previous_x + (x - previous_x) * game.interpolation
+            y = previous_y + (y - previous_y) * game.interpolation
+        return x / SUBPIXELS, y / SUBPIXELS
 
     def update(self, game):
         """
         This function works under assumption that tile object
-        is moving to is free (or reserved by MockupObject).
+        is moving to is free (or reserved by it with game.claim_tile).
         :param game
         """
+        self.remember_position(game)
         if self.in_move == 'up':
             self.in_move_delta_y -= self.step_size
-            if -self.in_move_delta_y >= TILE_SIZE:
+            if -self.in_move_delta_y >= TILE_UNITS:
                 game.objects[self.layer].pop((self.x, self.y))
                 self.y -= 1
                 self.in_move_delta_y = 0
                 game.objects[self.layer][(self.x, self.y)] = self
+                game.release_tile(self)
                 self.after_step(game)
         if self.in_move == 'down':
             self.in_move_delta_y += self.step_size
-            if self.in_move_delta_y >= TILE_SIZE:
+            if self.in_move_delta_y >= TILE_UNITS:
                 game.objects[self.layer].pop((self.x, self.y))
                 self.y += 1
                 self.in_move_delta_y = 0
                 game.objects[self.layer][(self.x, self.y)] = self
+                game.release_tile(self)
                 self.after_step(game)
         if self.in_move == 'left':
             self.in_move_delta_x -= self.step_size
-            if -self.in_move_delta_x >= TILE_SIZE:
+            if -self.in_move_delta_x >= TILE_UNITS:
                 game.objects[self.layer].pop((self.x, self.y))
                 self.x -= 1
                 self.in_move_delta_x = 0
                 game.objects[self.layer][(self.x, self.y)] = self
+                game.release_tile(self)
                 self.after_step(game)
         if self.in_move == 'right':
             self.in_move_delta_x += self.step_size
-            if self.in_move_delta_x >= TILE_SIZE:
+            if self.in_move_delta_x >= TILE_UNITS:
                 game.objects[self.layer].pop((self.x, self.y))
                 self.x += 1
                 self.in_move_delta_x = 0
                 game.objects[self.layer][(self.x, self.y)] = self
+                game.release_tile(self)
                 self.after_step(game)
 
     def render(self, game):
         if self.sprite_path is not None:
-            x = PLAYER_X + (self.x - game.player.x) * TILE_SIZE - game.player.in_move_delta_x + self.in_move_delta_x
-            y = PLAYER_Y + (self.y - game.player.y) * TILE_SIZE - game.player.in_move_delta_y + self.in_move_delta_y
+            x, y = self.render_position(game)
+            x += PLAYER_X - game.camera_x
+            y += PLAYER_Y - game.camera_y
             if in_render_range(x, y):
                 game.screen.blit(get_image(self.sprite_path), (x, y))
 
 
 class Ball(MovingObject):
+    color_sprite_paths = {
+        'red': join('objects', 'red_ball.png'),
+        'green': join('objects', 'green_ball.png'),
+        'blue': join('objects', 'blue_ball.png'),
+    }
+    __slots__ = ('on_pad', 'color')
+
     def __init__(self, x, y, color, miscellaneous=None):
         super().__init__(x, y, TILE_SIZE / 2, miscellaneous)
         self.on_pad = False
         self.color = color
-        if color == 'red':
-            self.sprite_path = join('objects', 'red_ball.png')
-        elif color == 'green':
-            self.sprite_path = join('objects', 'green_ball.png')
-        elif color == 'blue':
-            self.sprite_path = join('objects', 'blue_ball.png')
+        if color in self.color_sprite_paths:
+            self.sprite_path = self.color_sprite_paths[color]
         else:
-            exit("Error when initializing Ball object: \"" + color + "\" is not a color.")
+            raise ValueError("Error when initializing Ball object: \"" + str(color) + "\" is not a color.")
+
+    def arguments(self):
+        return [self.x, self.y, self.color, self.miscellaneous]
 
     def before_step(self, game, direction):
-        if game.tiles_map[self.y][self.x] in ['R', 'G', 'B', 'U']:
+        if game.tiles_map.get(self.x, self.y) in ANY_MAGNETIC_PAD:
             self.in_move = False
             return  # Can't move away from magnetic pads.
         pos = position_after_moving(self.x, self.y, direction)
         if not game.tile_is_free(pos[0], pos[1], self.layer):
             return  # Can't move if there is something in this place.
-        if game.tiles_map[pos[1]][pos[0]] == '#':
+        if game.tiles_map.get(pos[0], pos[1]) == WALL:
             return  # Can't move if terrain does not allow to do it.
-        if game.tiles_map[self.y][self.x] == self.color[0] and self.on_pad:
+        if game.tiles_map.get(self.x, self.y) == PADS[self.color] and self.on_pad:
             self.on_pad = False
             game.balls_left[color_to_index(self.color)] += 1
         self.in_move_delta_x = 0
         self.in_move_delta_y = 0
         self.in_move = direction
-        MockupObject(pos[0], pos[1], game, self)
+        game.claim_tile(pos[0], pos[1], self)
+        game.wake_object(self)
+
+    def is_awake(self):
+        return self.in_move is not False
 
     def after_step(self, game):
         pos = position_after_moving(self.x, self.y, self.in_move)
-        if (not game.tile_is_free(pos[0], pos[1], self.layer)) or game.tiles_map[pos[1]][pos[0]] == '#':
+        if (not game.tile_is_free(pos[0], pos[1], self.layer)) or game.tiles_map.get(pos[0], pos[1]) == WALL:
             # Ball can't keep moving if there is an obstacle.
             self.in_move = False
-        tile = game.tiles_map[self.y][self.x]
-        if tile == '~':
+        tile = game.tiles_map.get(self.x, self.y)
+        if tile == SAND:
             # Ball stops on sand.
             self.in_move = False
-        if not self.in_move and (tile == self.color[0] or tile == 'u'):
+        if not self.in_move and (tile == PADS[self.color] or tile == UNIVERSAL_PAD):
             # Count ball towards victory.
             self.on_pad = True
             game.balls_left[color_to_index(self.color)] -= 1
-        elif tile == self.color[0].capitalize() or tile == 'U':
+        elif tile == MAGNETIC_PADS[self.color] or tile == UNIVERSAL_MAGNETIC_PAD:
             # Magnetic pads stop balls regardless of color.
             self.in_move = False
             self.on_pad = True
@@ -238,69 +285,81 @@ class Ball(MovingObject):
 
 
 class Box(MovingObject):
-    drowning_speed = 6  # Frames for one image of drowning box
+    default_sprite_path = join('objects', 'box.png')
+    drowning_animation = Animation([join('objects', 'box_drowning_%d.png' % i) for i in range(1, 7)], 6, loop=False)
+    __slots__ = ('drowning_start',)
 
     def __init__(self, x, y, miscellaneous=None):
         super().__init__(x, y, TILE_SIZE / 6, miscellaneous)
-        self.sprite_path = join('objects', 'box.png')
-        self.drowning = 0
+        self.sprite_path = self.default_sprite_path
+        self.drowning_start = None  # Frame in which box started drowning
 
     def before_step(self, game, direction):
-        if self.drowning > 0:
+        if self.drowning_start is not None:
             return
         pos = position_after_moving(self.x, self.y, direction)
         if not game.tile_is_free(pos[0], pos[1], self.layer):
             return  # Can't move if there is something in this place.
         pos = position_after_moving(self.x, self.y, direction)
-        if game.tiles_map[pos[1]][pos[0]] == '#':
+        if game.tiles_map.get(pos[0], pos[1]) == WALL:
             return  # Can't move if terrain does not allow to do it.
         self.in_move = direction
-        MockupObject(pos[0], pos[1], game, self)
+        game.claim_tile(pos[0], pos[1], self)
+        game.wake_object(self)
+
+    def is_awake(self):
+        return self.in_move is not False or self.drowning_start is not None
 
     def after_step(self, game):
         self.in_move = False
-        if game.tiles_map[self.y][self.x] == '_':
+        if game.tiles_map.get(self.x, self.y) == WATER:
             # Box drowns.
-            self.drowning = 1
-        if game.tiles_map[self.y][self.x] == 'l':
+            self.drowning_start = game.frame
+        if game.tiles_map.get(self.x, self.y) == LILY:
             # Box and lily drown.
-            self.drowning = 1
-            row = game.tiles_map[self.y]
-            game.tiles_map[self.y] = row[:self.x] + '_' + row[self.x + 1:]
+            self.drowning_start = game.frame
+            game.set_tile(self.x, self.y, '_')
 
     def on_touch(self, game, direction):
         self.before_step(game, direction)
 
     def update(self, game):
-        if self.drowning == 0:
+        if self.drowning_start is None:
             super().update(game)
-        else:
-            sprite_number = str(self.drowning // self.drowning_speed + 1)
-            self.sprite_path = join('objects', 'box_drowning_' + sprite_number + '.png')
-            self.drowning += 1
-        if self.drowning == 6 * self.drowning_speed:
-            game.objects[self.layer].pop((self.x, self.y))
+        elif self.drowning_animation.is_over(game.frame + 1, self.drowning_start):
+            # Frame counter is advanced after update, so frame which would be rendered is checked.
+            game.remove_object(self)
+
+    def render(self, game):
+        if self.drowning_start is not None:
+            self.sprite_path = self.drowning_animation.sprite_path(game.frame, self.drowning_start)
+        super().render(game)
 
 
 class Player(MovingObject):
-    def __init__(self, x, y, init_function=lwr(None), miscellaneous=None):
+    sprites_paths = {
+        'left': join('objects', 'player_left.png'),
+        'right': join('objects', 'player_right.png'),
+        'up': join('objects', 'player_up.png'),
+        'down': join('objects', 'player_down.png'),
+    }
+    hud_path = join('hud', 'stats.png')
+    inventory_path = join('hud', 'inventory.png')
+    no_item_path = join('hud', 'no_item.png')
+    total_huds = 3
+    __slots__ = ('steps', 'selected_hud', 'hud_cache', 'hud_cache_state', 'dead', 'direction_facing', 'inventory',
+                 'selected_item_index', 'init_function')
+
+    def __init__(self, x, y, init_function=None, miscellaneous=None):
         super().__init__(x, y, TILE_SIZE / 4, miscellaneous)
         self.steps = 0
-        self.sprites_paths = {
-            'left': join('objects', 'player_left.png'),
-            'right': join('objects', 'player_right.png'),
-            'up': join('objects', 'player_up.png'),
-            'down': join('objects', 'player_down.png'),
-        }
-        self.hud_path = join('hud', 'stats.png')
-        self.inventory_path = join('hud', 'inventory.png')
-        self.no_item_path = join('hud', 'no_item.png')
         # List of HUDs:
         # 0 - don't display anything
         # 1 - display balls and diamonds left and steps taken
         # 2 - display items
         self.selected_hud = 1
-        self.total_huds = 3
+        self.hud_cache = None
+        self.hud_cache_state = None
         self.dead = False
         self.direction_facing = 'down'
         # Inventory keeps two lists of same length. First list contains names of items.
@@ -309,15 +368,20 @@ class Player(MovingObject):
         self.selected_item_index = 0
         self.init_function = init_function
 
+    def arguments(self):
+        return [self.x, self.y, self.init_function, self.miscellaneous]
+
     def before_step(self, game, direction):
         self.direction_facing = direction
         pos = position_after_moving(self.x, self.y, direction)
         game_object = game.objects[self.layer].get(pos)
         if game_object is None:
-            if game.tiles_map[pos[1]][pos[0]] in ['#', '_']:
+            if game.tiles_map.get(pos[0], pos[1]) in (WALL, WATER):
                 return  # Can't move if terrain does not allow to do it.
+            if game.occupant(pos[0], pos[1], self.layer) is not None:
+                return  # Can't move if something else is moving there.
             self.in_move = direction
-            MockupObject(pos[0], pos[1], game, self)
+            game.claim_tile(pos[0], pos[1], self)
         else:
             game_object.on_touch(game, direction)
 
@@ -334,29 +398,30 @@ class Player(MovingObject):
         self.dead = True
 
     def update(self, game):
+        self.remember_position(game)
         if self.in_move == 'up':
             self.in_move_delta_y -= self.step_size
-            if -self.in_move_delta_y >= TILE_SIZE:
+            if -self.in_move_delta_y >= TILE_UNITS:
                 self.y -= 1
-                game.objects[self.layer].pop((self.x, self.y))
+                game.release_tile(self)
                 self.after_step(game)
         if self.in_move == 'down':
             self.in_move_delta_y += self.step_size
-            if self.in_move_delta_y >= TILE_SIZE:
+            if self.in_move_delta_y >= TILE_UNITS:
                 self.y += 1
-                game.objects[self.layer].pop((self.x, self.y))
+                game.release_tile(self)
                 self.after_step(game)
         if self.in_move == 'left':
             self.in_move_delta_x -= self.step_size
-            if -self.in_move_delta_x >= TILE_SIZE:
+            if -self.in_move_delta_x >= TILE_UNITS:
                 self.x -= 1
-                game.objects[self.layer].pop((self.x, self.y))
+                game.release_tile(self)
                 self.after_step(game)
         if self.in_move == 'right':
             self.in_move_delta_x += self.step_size
-            if self.in_move_delta_x >= TILE_SIZE:
+            if self.in_move_delta_x >= TILE_UNITS:
                 self.x += 1
-                game.objects[self.layer].pop((self.x, self.y))
+                game.release_tile(self)
                 self.after_step(game)
 
     def select_previous_item(self):
@@ -395,251 +460,226 @@ class Player(MovingObject):
     def switch_hud(self):
         self.selected_hud = (self.selected_hud + 1) % self.total_huds
 
-    def render(self, game):
-        game.screen.blit(get_image(self.sprites_paths[self.direction_facing]), (PLAYER_X, PLAYER_Y))
+    def hud_state(self, game):
+        """
+        :return: Tuple of everything displayed in HUD.
+        """
+        return (self.selected_hud, tuple(game.balls_left), game.diamonds_left, self.steps, game.level.steps,
+                tuple(str(item) for item in self.inventory[0]), tuple(self.inventory[1]), self.selected_item_index)
+
+    def compose_hud(self, game):
+        """
+        Render selected HUD.
+        :return: Surface with HUD.
+        """
         white = colors['white']
+        font = get_font(SMALL_FONT_SIZE)
         if self.selected_hud == 1:
-            game.screen.blit(get_image(self.hud_path), (HUD_X_POSITION, HUD_Y_POSITION))
-            center_x = HUD_X_POSITION + HUD_BORDER_SIZE + HUD_BOX_SIZE / 2
-            center_y = HUD_Y_POSITION + 2 * HUD_BORDER_SIZE + 3 * HUD_BOX_SIZE / 2
+            background = get_image(self.hud_path)
+            surface = pygame.Surface(background.get_size(), pygame.SRCALPHA)
+            surface.blit(background, (0, 0))
+            center_x = HUD_BORDER_SIZE + HUD_BOX_SIZE / 2
+            center_y = 2 * HUD_BORDER_SIZE + 3 * HUD_BOX_SIZE / 2
             for i in range(3):
-                text = SMALL_FONT.render(str(game.balls_left[i]), True, white)
+                text = get_text(str(game.balls_left[i]), font, white)
                 rect = text.get_rect(center=(center_x, center_y))
-                game.screen.blit(text, rect)
+                surface.blit(text, rect)
                 center_x += HUD_BOX_SIZE + HUD_BORDER_SIZE
-            text = SMALL_FONT.render(str(game.diamonds_left), True, white)
+            text = get_text(str(game.diamonds_left), font, white)
             rect = text.get_rect(center=(center_x, center_y))
-            game.screen.blit(text, rect)
-            center_x = HUD_X_POSITION + 5 * HUD_BORDER_SIZE / 2 + 2 * HUD_BOX_SIZE
+            surface.blit(text, rect)
+            center_x = 5 * HUD_BORDER_SIZE / 2 + 2 * HUD_BOX_SIZE
             center_y += HUD_BOX_SIZE + HUD_BORDER_SIZE
-            text = SMALL_FONT.render("Steps: " + str(self.steps) + "/"
-                                     + str(game.level.steps), True, white)
+            text = get_text("Steps: " + str(self.steps) + "/" + str(game.level.steps), font, white)
             rect = text.get_rect(center=(center_x, center_y))
-            game.screen.blit(text, rect)
-        elif self.selected_hud == 2:
-            game.screen.blit(get_image(self.inventory_path), (HUD_X_POSITION, HUD_Y_POSITION))
-            center_x = HUD_X_POSITION + 5 * HUD_BORDER_SIZE / 2 + 2 * HUD_BOX_SIZE
-            center_y = HUD_Y_POSITION + HUD_BORDER_SIZE + HUD_BOX_SIZE / 2
+            surface.blit(text, rect)
+        else:
+            background = get_image(self.inventory_path)
+            surface = pygame.Surface(background.get_size(), pygame.SRCALPHA)
+            surface.blit(background, (0, 0))
+            center_x = 5 * HUD_BORDER_SIZE / 2 + 2 * HUD_BOX_SIZE
+            center_y = HUD_BORDER_SIZE + HUD_BOX_SIZE / 2
             if len(self.inventory[0]) != 0:
-                text = SMALL_FONT.render(str(self.inventory[0][self.selected_item_index]), True, white)
+                text = get_text(str(self.inventory[0][self.selected_item_index]), font, white)
             else:
-                text = SMALL_FONT.render("Empty inventory", True, white)
+                text = get_text("Empty inventory", font, white)
             rect = text.get_rect(center=(center_x, center_y))
-            game.screen.blit(text, rect)
-            center_x = HUD_X_POSITION + HUD_BORDER_SIZE + HUD_BOX_SIZE / 2
-            center_y = HUD_Y_POSITION + 2 * HUD_BORDER_SIZE + 3 * HUD_BOX_SIZE / 2
-            text = SMALL_FONT.render("Z", True, white)
+            surface.blit(text, rect)
+            center_x = HUD_BORDER_SIZE + HUD_BOX_SIZE / 2
+            center_y = 2 * HUD_BORDER_SIZE + 3 * HUD_BOX_SIZE / 2
+            text = get_text("Z", font, white)
             rect = text.get_rect(center=(center_x, center_y))
-            game.screen.blit(text, rect)
+            surface.blit(text, rect)
             center_x += (HUD_BOX_SIZE + HUD_BORDER_SIZE) * 3
-            text = SMALL_FONT.render("X", True, white)
+            text = get_text("X", font, white)
             rect = text.get_rect(center=(center_x, center_y))
-            game.screen.blit(text, rect)
+            surface.blit(text, rect)
             corner_x = center_x - TILE_SIZE / 2 - 2 * (HUD_BOX_SIZE + HUD_BORDER_SIZE)
             corner_y = center_y - TILE_SIZE / 2
             if len(self.inventory[0]) != 0:
-                game.screen.blit(get_image(self.inventory[0][self.selected_item_index].path), (corner_x, corner_y))
+                surface.blit(get_image(self.inventory[0][self.selected_item_index].path), (corner_x, corner_y))
             else:
-                game.screen.blit(get_image(self.no_item_path), (corner_x, corner_y))
+                surface.blit(get_image(self.no_item_path), (corner_x, corner_y))
             if len(self.inventory[0]) != 0:
                 center_x -= HUD_BOX_SIZE + HUD_BORDER_SIZE
-                text = SMALL_FONT.render(str(self.inventory[1][self.selected_item_index]), True, white)
+                text = get_text(str(self.inventory[1][self.selected_item_index]), font, white)
                 rect = text.get_rect(center=(center_x, center_y))
-                game.screen.blit(text, rect)
+                surface.blit(text, rect)
             else:
                 corner_x += HUD_BOX_SIZE + HUD_BORDER_SIZE
-                game.screen.blit(get_image(self.no_item_path), (corner_x, corner_y))
-            center_x = HUD_X_POSITION + 5 * HUD_BORDER_SIZE / 2 + 2 * HUD_BOX_SIZE
+                surface.blit(get_image(self.no_item_path), (corner_x, corner_y))
+            center_x = 5 * HUD_BORDER_SIZE / 2 + 2 * HUD_BOX_SIZE
             center_y += HUD_BOX_SIZE + HUD_BORDER_SIZE
-            text = SMALL_FONT.render("Space: use item", True, white)
+            text = get_text("Space: use item", font, white)
             rect = text.get_rect(center=(center_x, center_y))
-            game.screen.blit(text, rect)
+            surface.blit(text, rect)
+        return surface
+
+    def render(self, game):
+        game.screen.blit(get_image(self.sprites_paths[self.direction_facing]), (PLAYER_X, PLAYER_Y))
+        if self.selected_hud != 0:
+            # HUD is composed again only when something displayed in it has changed.
+            state = self.hud_state(game)
+            if state != self.hud_cache_state:
+                self.hud_cache = self.compose_hud(game)
+                self.hud_cache_state = state
+            game.screen.blit(self.hud_cache, (HUD_X_POSITION, HUD_Y_POSITION))
 
 
 class Diamond(GameObject):
-    def __init__(self, x, y, miscellaneous=None):
-        super().__init__(x, y, miscellaneous)
-        self.sprite_paths_list = [
-            join('objects', 'diamond_1.png'),
-            join('objects', 'diamond_2.png'),
-            join('objects', 'diamond_3.png'),
-        ]
-        self.sprite_number = 0
-        self.animation_time = 0
-        self.max_animation_time = 60
+    animation = Animation([
+        join('objects', 'diamond_1.png'),
+        join('objects', 'diamond_2.png'),
+        join('objects', 'diamond_3.png'),
+    ], 60)
+    __slots__ = ()
+
+    def is_awake(self):
+        return False
 
     def on_touch(self, game, _):
         game.diamonds_left -= 1
-        game.objects[self.layer].pop((self.x, self.y))
+        game.remove_object(self)
 
-    def update(self, game):
-        self.sprite_path = self.sprite_paths_list[self.sprite_number]
-        self.animation_time += 1
-        if self.animation_time == self.max_animation_time:
-            self.animation_time = 0
-            self.sprite_number += 1
-            if self.sprite_number == len(self.sprite_paths_list):
-                self.sprite_number = 0
+    def render(self, game):
+        self.sprite_path = self.animation.sprite_path(game.frame)
+        super().render(game)
 
 
 class Envelope(GameObject):
+    default_sprite_path = join('objects', 'envelope.png')
+    __slots__ = ('message',)
+
     def __init__(self, x, y, message, miscellaneous=None):
         super().__init__(x, y, miscellaneous)
-        self.sprite_path = join('objects', 'envelope.png')
+        self.sprite_path = self.default_sprite_path
         self.message = message
 
+    def arguments(self):
+        return [self.x, self.y, self.message, self.miscellaneous]
+
+    def is_awake(self):
+        return False
+
     def on_touch(self, game, _):
-        game.objects[self.layer].pop((self.x, self.y))
-        clock = pygame.time.Clock()
-        message_loop = True
-        rect = pygame.Rect(100, 100, SCREEN_X_SIZE - 200, SCREEN_Y_SIZE - 200)
+        game.remove_object(self)
         game.reset_arrow_keys()
-        try:
-            text = render_textrect(self.message, MID_FONT, rect, colors['white'], colors['orange'], 0)
-        except TextRectException:
-            try:
-                text = render_textrect(self.message, SMALL_FONT, rect, colors['white'], colors['orange'], 0)
-            except TextRectException:
-                text = render_textrect("Message is too long to be displayed.",
-                                       MID_FONT, rect, colors['white'], colors['orange'], 0)
-        while message_loop:
-            events = pygame.event.get()
-            for event in events:
-                if event.type == pygame.QUIT:
-                    quit(0)
-                if event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN:
-                    message_loop = False
-            game.screen.blit(text, rect.topleft)
-            pygame.display.flip()
-            clock.tick(CLOCK_TICK)
+        game.messages.append(self.message)
 
 
 class Portal(GameObject):
+    animation = Animation([
+        join('objects', 'portal_1.png'),
+        join('objects', 'portal_2.png'),
+    ], 60)
+    portal_blocked_sprite_path = join('objects', 'portal_blocked.png')
+    alert_sprite_path = join('objects', 'alert.png')
+    alert_duration = 60  # Frames for which portal stays blocked after touching it
+    __slots__ = ('destination_x', 'destination_y', 'alert_start')
+
     def __init__(self, x, y, destination_x, destination_y, miscellaneous=None):
         super().__init__(x, y, miscellaneous)
         self.destination_x = destination_x
         self.destination_y = destination_y
-        self.sprite_paths_list = [
-            join('objects', 'portal_1.png'),
-            join('objects', 'portal_2.png'),
-        ]
-        self.portal_blocked_sprite_path = join('objects', 'portal_blocked.png')
-        self.alert_sprite_path = join('objects', 'alert.png')
-        self.sprite_number = 0
-        self.animation_time = 0
-        self.max_animation_time = 60
-        self.display_alert = 0
+        self.alert_start = None  # Frame in which blocked portal was touched
+
+    def arguments(self):
+        return [self.x, self.y, self.destination_x, self.destination_y, self.miscellaneous]
 
     def on_touch(self, game, _):
         if (game.tile_is_free(self.destination_x, self.destination_y, self.layer) and
-                game.tiles_map[self.destination_y][self.destination_x] != '#'):
+                game.tiles_map.get(self.destination_x, self.destination_y) != WALL):
             game.player.x = self.destination_x
             game.player.y = self.destination_y
             game.player.after_step(game)
             game.reset_arrow_keys()
         else:
-            self.display_alert = 1
+            self.alert_start = game.frame
 
-    def update(self, game):
-        if self.display_alert == 0:
-            self.sprite_path = self.sprite_paths_list[self.sprite_number]
-            self.animation_time += 1
-            if self.animation_time == self.max_animation_time:
-                self.animation_time = 0
-                self.sprite_number += 1
-                if self.sprite_number == len(self.sprite_paths_list):
-                    self.sprite_number = 0
-        else:
-            self.sprite_path = self.portal_blocked_sprite_path
+    def is_awake(self):
+        return False
 
     def render(self, game):
+        alert = self.alert_start is not None and game.frame - self.alert_start < self.alert_duration
+        if alert:
+            self.sprite_path = self.portal_blocked_sprite_path
+        else:
+            self.sprite_path = self.animation.sprite_path(game.frame)
         super().render(game)
-        if self.display_alert == self.max_animation_time:
-            self.display_alert = 0
-        if self.display_alert > 0:
-            self.display_alert += 1
-            x = PLAYER_X + (self.destination_x - game.player.x) * TILE_SIZE - game.player.in_move_delta_x
-            y = PLAYER_Y + (self.destination_y - game.player.y) * TILE_SIZE - game.player.in_move_delta_y
+        if alert:
+            x = PLAYER_X + self.destination_x * TILE_SIZE - game.camera_x
+            y = PLAYER_Y + self.destination_y * TILE_SIZE - game.camera_y
             if in_render_range(x, y):
                 game.foreground.append((x, y, self.alert_sprite_path))
 
 
 class Cannonball(MovingObject):
+    """
+    Cannonball placed by level (or event). Registered cannonballs are not
+    kept as objects, game moves them to game.projectiles (see projectiles.py).
+    """
+    __slots__ = ()
+
     def __init__(self, x, y, direction, speed, miscellaneous=None):
         super().__init__(x, y, speed, miscellaneous)
         self.in_move = direction
-        self.sprite_path = join('objects', 'cannonball.png')
-
-    def update(self, game):
-        if self.in_move == 'up':
-            self.in_move_delta_y -= self.step_size
-            if -self.in_move_delta_y >= TILE_SIZE:
-                game.objects[self.layer].pop((self.x, self.y))
-                self.y -= 1
-                self.in_move_delta_y = 0
-                self.after_step(game)
-        if self.in_move == 'down':
-            self.in_move_delta_y += self.step_size
-            if self.in_move_delta_y >= TILE_SIZE:
-                game.objects[self.layer].pop((self.x, self.y))
-                self.y += 1
-                self.in_move_delta_y = 0
-                self.after_step(game)
-        if self.in_move == 'left':
-            self.in_move_delta_x -= self.step_size
-            if -self.in_move_delta_x >= TILE_SIZE:
-                game.objects[self.layer].pop((self.x, self.y))
-                self.x -= 1
-                self.in_move_delta_x = 0
-                self.after_step(game)
-        if self.in_move == 'right':
-            self.in_move_delta_x += self.step_size
-            if self.in_move_delta_x >= TILE_SIZE:
-                game.objects[self.layer].pop((self.x, self.y))
-                self.x += 1
-                self.in_move_delta_x = 0
-                self.after_step(game)
 
-    def after_step(self, game):
-        if (game.player.x, game.player.y) == (self.x, self.y):
-            game.player.on_hit(game, opposite_direction(self.in_move))
-        collide = game.objects[self.layer].get((self.x, self.y))
-        if collide is not None and isinstance(collide, MockupObject):
-            collide = collide.owner
-        if collide is not None:
-            collide.on_hit(game, opposite_direction(self.in_move))
-            return
-        if game.tiles_map[self.y][self.x] == '#':
-            return
-        game.objects[self.layer][(self.x, self.y)] = self
+    def arguments(self):
+        return [self.x, self.y, self.in_move, self.speed, self.miscellaneous]
 
 
 class Cannon(GameObject):
+    direction_sprite_paths = {direction: join('objects', 'cannon_' + direction + '.png')
+                              for direction in ('left', 'right', 'up', 'down')}
+    __slots__ = ('shooting_direction', 'get_shooting_delay', 'get_bullet_speed', 'cannon_counter', 'delay')
+
     def __init__(self, x, y, direction, shooting_delay_function, bullet_speed_function, miscellaneous=None):
         super().__init__(x, y, miscellaneous)
         assert_direction(direction)
         self.shooting_direction = direction
-        self.sprite_path = join('objects', 'cannon_' + direction + '.png')
+        self.sprite_path = self.direction_sprite_paths[direction]
         self.get_shooting_delay = shooting_delay_function
         self.get_bullet_speed = bullet_speed_function
         self.cannon_counter = 0
         self.delay = self.get_shooting_delay(0)
 
+    def arguments(self):
+        return [self.x, self.y, self.shooting_direction, self.get_shooting_delay, self.get_bullet_speed,
+                self.miscellaneous]
+
     def update(self, game):
         if self.delay == 0:
             pos = position_after_moving(self.x, self.y, self.shooting_direction)
             if (game.player.x, game.player.y) == pos:
                 game.player.on_hit(game, opposite_direction(self.shooting_direction))
                 return
-            if game.tiles_map[pos[1]][pos[0]] != '#':
-                collide = game.objects[self.layer].get(pos)
-                if collide is not None and isinstance(collide, MockupObject):
-                    collide = collide.owner
+            if game.tiles_map.get(pos[0], pos[1]) != WALL:
+                collide = game.occupant(pos[0], pos[1], self.layer)
                 if collide is not None:
                     collide.on_hit(game, opposite_direction(self.shooting_direction))
                 else:
-                    game.register_object(Cannonball(pos[0], pos[1], self.shooting_direction,
-                                                    self.get_bullet_speed(self.cannon_counter)))
+                    game.projectiles.add(pos[0], pos[1], self.shooting_direction,
+                                         self.get_bullet_speed(self.cannon_counter))
             self.cannon_counter += 1
             self.delay = self.get_shooting_delay(self.cannon_counter)
         else:
@@ -647,73 +687,60 @@ class Cannon(GameObject):
 
 
 class Door(GameObject):
+    default_sprite_path = join('objects', 'door_locked.png')
+    __slots__ = ('container', 'condition_on_update', 'condition_on_touch')
+
     def __init__(self, x, y, container, miscellaneous=None):
         super().__init__(x, y, miscellaneous)
+        if not isinstance(container, dict):
+            raise TypeError("Container of Door has to be a dictionary, not %r." % (container,))
         self.container = container
         self.condition_on_update = self.container.get('condition_on_update')
         self.condition_on_touch = self.container.get('condition_on_touch')
-        self.sprite_path = join('objects', 'door_locked.png')
+        self.sprite_path = self.default_sprite_path
+
+    def arguments(self):
+        return [self.x, self.y, self.container, self.miscellaneous]
 
     def update(self, game):
         if self.condition_on_update is not None and self.condition_on_update(game, self.container):
-            game.objects[self.layer].pop((self.x, self.y))
+            game.remove_object(self)
 
     def on_touch(self, game, direction):
         if self.condition_on_touch is not None and self.condition_on_update(game, direction, self.container):
-            game.objects[self.layer].pop((self.x, self.y))
+            game.remove_object(self)
 
 
 class LittleDevil(MovingObject):
+    default_sprite_path = join('objects', 'little_devil.png')
+    __slots__ = ('health',)
+
     def __init__(self, x, y, speed, health=0, miscellaneous=None):
         super().__init__(x, y, speed, miscellaneous)
-        self.sprite_path = join('objects', 'little_devil.png')
+        self.sprite_path = self.default_sprite_path
         self.health = health
-        self.mockup = None
+
+    def arguments(self):
+        return [self.x, self.y, self.speed, self.health, self.miscellaneous]
 
     def __verify_direction(self, game, direction):
-        if direction is False:
-            return
         pos = position_after_moving(self.x, self.y, direction)
-        if game.tiles_map[pos[1]][pos[0]] == '#':
-            direction = False
-        elif pos in game.objects[self.layer]:
-                direction = False
-        if direction is not False:
+        if game.occupant(pos[0], pos[1], self.layer) is None:
             self.in_move = direction
-            self.mockup = MockupObject(pos[0], pos[1], game, self)
+            game.claim_tile(pos[0], pos[1], self)
 
     def update(self, game):
         if not self.in_move:
-            distance_x = game.player.x - self.x
-            distance_y = game.player.y - self.y
-            if distance_y < 0:
-                in_move_y = 'up'
-            elif distance_y > 0:
-                in_move_y = 'down'
-            else:
-                in_move_y = False
-            if distance_x < 0:
-                in_move_x = 'left'
-            elif distance_x > 0:
-                in_move_x = 'right'
-            else:
-                in_move_x = False
-            # Cover larger distance first
-            if abs(distance_x) < abs(distance_y):
-                in_move_first_direction = in_move_y
-                in_move_second_direction = in_move_x
-            else:
-                in_move_first_direction = in_move_x
-                in_move_second_direction = in_move_y
-            # Little devil has chosen potential directions of move, but we still need to check whether he can move there
-            self.__verify_direction(game, in_move_first_direction)
-            if not self.in_move:
-                self.__verify_direction(game, in_move_second_direction)
+            # Flow field gives directions along shortest paths to the player (around walls),
+            # but we still need to check whether no object blocks the way.
+            for direction in game.flow_field.directions(self.x, self.y, (game.player.x, game.player.y)):
+                self.__verify_direction(game, direction)
+                if self.in_move:
+                    break
         # Now little devil has chosen direction of move (could be False) and will move
         super().update(game)
 
     def after_step(self, game):
-        self.mockup = None
         if (game.player.x, game.player.y) == (self.x, self.y):
             game.player.on_hit(game, opposite_direction(self.in_move))
         else:
@@ -723,20 +750,22 @@ class LittleDevil(MovingObject):
         if self.health > 0:
             self.health -= 1
             if self.health <= 0:
-                game.objects[self.layer].pop((self.x, self.y))
-                if self.mockup is not None:
-                    self.mockup.destroy()
-                    self.mockup = None
+                game.remove_object(self)
 
 
 class Ghost(MovingObject):
+    default_sprite_path = join('objects', 'ghost.png')
+    layer = 2  # This is ghost.
+    __slots__ = ('moving_path', 'target_place_index')
+
     def __init__(self, x, y, speed, path, miscellaneous=None):
         super().__init__(x, y, speed, miscellaneous)
-        self.moving_path = path
-        self.moving_path.insert(0, (x, y))
-        self.sprite_path = join('objects', 'ghost.png')
+        self.moving_path = [(x, y)] + [tuple(place) for place in path]
+        self.sprite_path = self.default_sprite_path
         self.target_place_index = 0
-        self.layer = 2  # This is ghost.
+
+    def arguments(self):
+        return [self.x, self.y, self.speed, self.moving_path[1:], self.miscellaneous]
 
     def update(self, game):
         if not self.in_move:
@@ -752,9 +781,7 @@ class Ghost(MovingObject):
         super().update(game)
 
     def after_step(self, game):
-        collide = game.objects[DEFAULT_LAYER].get((self.x, self.y))  # Player layer
-        if collide is not None and isinstance(collide, MockupObject):
-            collide = collide.owner
+        collide = game.occupant(self.x, self.y, DEFAULT_LAYER)  # Player layer
         if (game.player.x, game.player.y) == (self.x, self.y) or isinstance(collide, Player):
             game.player.on_hit(game, opposite_direction(self.in_move))
         else:
@@ -763,14 +790,20 @@ class Ghost(MovingObject):
 
 
 class HellEntrance(GameObject):
+    default_sprite_path = join('objects', 'hell_entrance.png')
+    layer = 0
+    __slots__ = ('frequency', 'speed', 'health', 'frame_counter')
+
     def __init__(self, x, y, frequency, speed, health=1, miscellaneous=None):
         super().__init__(x, y, miscellaneous)
-        self.sprite_path = join('objects', 'hell_entrance.png')
+        self.sprite_path = self.default_sprite_path
         self.frequency = frequency
         self.speed = speed
         self.health = health
         self.frame_counter = 0
-        self.layer = 0
+
+    def arguments(self):
+        return [self.x, self.y, self.frequency, self.speed, self.health, self.miscellaneous]
 
     def update(self, game):
         if self.frame_counter > 0:
@@ -779,12 +812,10 @@ class HellEntrance(GameObject):
             if (game.player.x, game.player.y) == (self.x, self.y):
                 game.player.on_hit(game, game.player.direction_facing)
                 return
-            collide = game.objects[DEFAULT_LAYER].get((self.x, self.y))
-            if collide is not None and isinstance(collide, MockupObject):
-                collide = collide.owner
+            collide = game.occupant(self.x, self.y, DEFAULT_LAYER)
             if collide is not None:
                 if isinstance(collide, Player):
-                    game.player.on_hit(game, self, game.player.direction_facing)
+                    game.player.on_hit(game, game.player.direction_facing)
                 return
             game.register_object(LittleDevil(self.x, self.y, self.speed, self.health))
             self.frame_counter = self.frequency
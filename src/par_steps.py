@@ -0,0 +1,105 @@
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from hashlib import sha1
+from os.path import join
+
+from levels import level_definitions, read_source
+from solver import Puzzle, Solver, Unsupported, SearchLimitReached
+
+
+def cache_path():
+    return join('..', 'par_steps.json')
+
+
+def load_cache():
+    try:
+        with open(cache_path(), 'r') as file:
+            return json.load(file)
+    except IOError:
+        return {}
+
+
+def save_cache(cache):
+    with open(cache_path(), 'w') as file:
+        json.dump(cache, file, indent=1, sort_keys=True)
+
+
+def solver_hash():
+    """
+    Changes of solver can change results, so its source code is part of cache key.
+    """
+    return sha1(read_source('solver.py').encode()).hexdigest()
+
+
+def puzzle_hash(puzzle, capacity, solver):
+    """
+    Results depend only on puzzle, solver and its capacity, so they are cached under hash of all of them.
+    :param solver: Hash of solver (see solver_hash).
+    """
+    return sha1(repr((puzzle.description(), capacity, solver)).encode()).hexdigest()
+
+
+def solve_puzzle(puzzle, capacity):
+    """
+    Run in worker process.
+    :return: Dictionary with 'status' ('solved', 'unsolvable', 'unsupported' or 'limit') and 'steps'
+             ('objects' with names of unsupported objects for 'unsupported').
+    """
+    try:
+        solution = Solver(puzzle, capacity).solve()
+    except SearchLimitReached:
+        return {'status': 'limit', 'steps': None}
+    if isinstance(solution, Unsupported):
+        return {'status': 'unsupported', 'steps': None, 'objects': solution.objects}
+    if solution is None:
+        return {'status': 'unsolvable', 'steps': None}
+    return {'status': 'solved', 'steps': solution.steps}
+
+
+def calculate_par_steps(capacity, workers=None, force=False):
+    """
+    Solve all levels in parallel. Levels solved before are taken from cache.
+    :param capacity: Maximal amount of states visited for one level.
+    :param workers: Amount of processes (None for amount of processors).
+    :param force: Ignore cache.
+    :return: List of (level, result) pairs.
+    """
+    levels = level_definitions()
+    puzzles = [Puzzle(level) for level in levels]
+    solver = solver_hash()
+    hashes = [puzzle_hash(puzzle, capacity, solver) for puzzle in puzzles]
+    cache = {} if force else load_cache()
+    missing = [i for i in range(len(levels)) if hashes[i] not in cache]
+    if len(missing) != 0:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(solve_puzzle, puzzles[i], capacity): i for i in missing}
+            for future in as_completed(futures):
+                cache[hashes[futures[future]]] = future.result()
+        save_cache(cache)
+    return [(levels[i], cache[hashes[i]]) for i in range(len(levels))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare steps of levels with optimal solutions.")
+    parser.add_argument('--capacity', type=int, default=1000000, help="maximal amount of states per level")
+    parser.add_argument('--workers', type=int, default=None, help="amount of processes")
+    parser.add_argument('--force', action='store_true', help="solve all levels again")
+    args = parser.parse_args()
+    print("Level  Steps  Optimal")
+    for number, (level, result) in enumerate(calculate_par_steps(args.capacity, args.workers, args.force)):
+        if result['status'] == 'solved':
+            optimal = str(result['steps'])
+            if result['steps'] > level.steps:
+                note = "steps are not attainable"
+            elif result['steps'] < level.steps:
+                note = "steps can be lowered"
+            else:
+                note = ""
+        elif result['status'] == 'limit':
+            optimal, note = "?", "too many states"
+        elif result['status'] == 'unsupported':
+            optimal, note = "?", "not solved on tile level: " + ", ".join(result['objects'])
+        else:
+            optimal, note = "-", "no solution on tile level"
+        print("%5d  %5d  %7s  %s" % (number + 1, level.steps, optimal, note))
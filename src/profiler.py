@@ -0,0 +1,78 @@
+from collections import deque
+from time import perf_counter
+
+
+class FrameProfiler:
+    """
+    Measures time spent in phases of frames. Call start() at the beginning
+    of frame, mark(phase) right after each phase and end() at the end of frame.
+    Time since previous mark is assigned to phase.
+    """
+    def __init__(self, window=None, enabled=True):
+        """
+        :param window: Amount of latest frames kept for each phase (None - keep all).
+        :param enabled: Disabled profiler doesn't measure anything.
+        """
+        self.window = window
+        self.timings = {}
+        self.frame_start = 0
+        self.last_mark = 0
+        self._enabled = False
+        self.enabled = enabled
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value):
+        """
+        Profiler can be enabled in the middle of frame, so measuring starts right now
+        (instead of from values left from the time it was disabled).
+        """
+        if value and not self._enabled:
+            self.frame_start = self.last_mark = perf_counter()
+        self._enabled = value
+
+    def start(self):
+        if self.enabled:
+            self.frame_start = self.last_mark = perf_counter()
+
+    def mark(self, phase):
+        if self.enabled:
+            now = perf_counter()
+            self.record(phase, now - self.last_mark)
+            self.last_mark = now
+
+    def end(self):
+        if self.enabled:
+            self.record('frame', perf_counter() - self.frame_start)
+
+    def record(self, phase, duration):
+        timings = self.timings.get(phase)
+        if timings is None:
+            timings = self.timings[phase] = deque(maxlen=self.window)
+        timings.append(duration)
+
+    def mean(self, phase):
+        """
+        :return: Mean time of phase in milliseconds.
+        """
+        timings = self.timings.get(phase)
+        if not timings:
+            return 0
+        return 1000 * sum(timings) / len(timings)
+
+    def summary(self):
+        """
+        :return: Dictionary phase: {'mean', 'p95', 'p99'} with times in milliseconds.
+        """
+        result = {}
+        for phase, timings in self.timings.items():
+            ordered = sorted(timings)
+            result[phase] = {
+                'mean': round(self.mean(phase), 4),
+                'p95': round(1000 * ordered[int(0.95 * (len(ordered) - 1))], 4),
+                'p99': round(1000 * ordered[int(0.99 * (len(ordered) - 1))], 4),
+            }
+        return result
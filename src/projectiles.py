@@ -0,0 +1,174 @@
+import numpy as np
+from os.path import join
+
+from const import TILE_SIZE, TILE_UNITS, SUBPIXELS, PLAYER_X, PLAYER_Y, SCREEN_X_SIZE, SCREEN_Y_SIZE, DEFAULT_LAYER, \
+    units_per_tick
+from directions import opposite_direction
+from images import get_image
+from tiles import WALL
+
+DIRECTIONS = ('up', 'down', 'left', 'right')
+# Change of coordinates after moving in direction (indexed as DIRECTIONS).
+DIRECTION_X = np.array([0, 0, -1, 1], dtype=np.int64)
+DIRECTION_Y = np.array([-1, 1, 0, 0], dtype=np.int64)
+
+
+class ProjectilePool:
+    """
+    Cannonballs kept as struct of arrays - one NumPy array for every attribute,
+    first count entries are alive. All projectiles are moved together once per
+    frame, collisions are checked only for those which have arrived to a new tile.
+    Projectile occupies its tile like an object (see Game.occupant), but it
+    ignores hits and touches.
+    """
+    sprite_path = join('objects', 'cannonball.png')
+    layer = DEFAULT_LAYER
+    fields = (
+        ('x', np.int64),
+        ('y', np.int64),
+        ('direction', np.int8),  # Index in DIRECTIONS
+        ('delta', np.int64),  # Distance flown from (x, y) in fixed-point units
+        ('step_size', np.int64),  # Fixed-point units per tick
+        ('previous_x', np.int64),  # Position in previous tick, used to interpolate rendering
+        ('previous_y', np.int64),
+    )
+
+    def __init__(self, capacity=64):
+        """
+        :param capacity: Initial length of arrays (they grow when needed).
+        """
+        self.count = 0
+        self.capacity = capacity
+        for name, dtype in self.fields:
+            setattr(self, name, np.zeros(capacity, dtype))
+        self.occupied = {}  # Tile: amount of projectiles in it (more of them can fly through the same tile)
+
+    def __len__(self):
+        return self.count
+
+    def add(self, x, y, direction, speed):
+        """
+        :param x, y: Coordinates.
+        :param direction: Direction of flight.
+        :param speed: Speed in tiles per second.
+        """
+        if self.count == self.capacity:
+            self.grow()
+        i = self.count
+        self.x[i], self.y[i] = x, y
+        self.direction[i] = DIRECTIONS.index(direction)
+        self.delta[i] = 0
+        self.step_size[i] = units_per_tick(speed)
+        self.previous_x[i], self.previous_y[i] = x * TILE_UNITS, y * TILE_UNITS
+        self.count += 1
+        self.occupy((x, y))
+
+    def occupy(self, tile):
+        self.occupied[tile] = self.occupied.get(tile, 0) + 1
+
+    def vacate(self, tile):
+        """
+        Tile stays occupied while there is another projectile in it.
+        """
+        count = self.occupied[tile] - 1
+        if count == 0:
+            del self.occupied[tile]
+        else:
+            self.occupied[tile] = count
+
+    def grow(self):
+        self.capacity *= 2
+        for name, _ in self.fields:
+            array = getattr(self, name)
+            grown = np.zeros(self.capacity, array.dtype)
+            grown[:self.count] = array[:self.count]
+            setattr(self, name, grown)
+
+    def remove(self, indexes):
+        """
+        Remove projectiles, order of the others is kept.
+        :param indexes: List of indexes.
+        """
+        keep = np.ones(self.count, dtype=bool)
+        keep[indexes] = False
+        kept = np.flatnonzero(keep)
+        for name, _ in self.fields:
+            array = getattr(self, name)
+            array[:len(kept)] = array[kept]
+        self.count = len(kept)
+
+    def positions(self):
+        """
+        :return: Arrays of x and y positions on map in fixed-point units.
+        """
+        n = self.count
+        direction = self.direction[:n]
+        return (self.x[:n] * TILE_UNITS + DIRECTION_X[direction] * self.delta[:n],
+                self.y[:n] * TILE_UNITS + DIRECTION_Y[direction] * self.delta[:n])
+
+    def update(self, game):
+        """
+        Move all projectiles by one tick. Projectile arriving to a tile hits
+        player standing there, and is destroyed by object (or projectile) in it or by wall.
+        :param game: Game instance.
+        """
+        n = self.count
+        if n == 0:
+            return
+        self.previous_x[:n], self.previous_y[:n] = self.positions()
+        self.delta[:n] += self.step_size[:n]
+        arrived = np.flatnonzero(self.delta[:n] >= TILE_UNITS)
+        if len(arrived) == 0:
+            return
+        self.delta[arrived] = 0
+        old_x, old_y = self.x[arrived], self.y[arrived]
+        new_x = old_x + DIRECTION_X[self.direction[arrived]]
+        new_y = old_y + DIRECTION_Y[self.direction[arrived]]
+        self.x[arrived], self.y[arrived] = new_x, new_y
+        tiles = np.frombuffer(game.tiles_map.cells, dtype=np.uint8).reshape(game.tiles_map.height,
+                                                                            game.tiles_map.width)
+        walls = tiles[new_y, new_x] == WALL
+        hits_player = (new_x == game.player.x) & (new_y == game.player.y)
+        removed = []
+        # Only arrived projectiles are checked against objects, in order in which they were fired.
+        for i, x, y, previous_tile, wall, hit in zip(arrived.tolist(), new_x.tolist(), new_y.tolist(),
+                                                     zip(old_x.tolist(), old_y.tolist()), walls.tolist(),
+                                                     hits_player.tolist()):
+            self.vacate(previous_tile)
+            direction = opposite_direction(DIRECTIONS[self.direction[i]])
+            if hit:
+                game.player.on_hit(game, direction)
+            collide = game.occupant(x, y, self.layer)
+            if collide is not None:
+                collide.on_hit(game, direction)
+                removed.append(i)
+            elif wall:
+                removed.append(i)
+            else:
+                self.occupy((x, y))
+        if removed:
+            self.remove(removed)
+
+    def on_hit(self, game, direction):
+        pass
+
+    def on_touch(self, game, direction):
+        pass
+
+    def render(self, game):
+        """
+        Projectiles are interpolated between previous and current tick, like other moving objects.
+        :param game: Game instance.
+        """
+        n = self.count
+        if n == 0:
+            return
+        x, y = self.positions()
+        previous_x, previous_y = self.previous_x[:n], self.previous_y[:n]
+        screen_x = (previous_x + (x - previous_x) * game.interpolation) / SUBPIXELS + (PLAYER_X - game.camera_x)
+        screen_y = (previous_y + (y - previous_y) * game.interpolation) / SUBPIXELS + (PLAYER_Y - game.camera_y)
+        visible = ((-TILE_SIZE < screen_x) & (screen_x < SCREEN_X_SIZE + TILE_SIZE) &
+                   (-TILE_SIZE < screen_y) & (screen_y < SCREEN_Y_SIZE + TILE_SIZE))
+        image = get_image(self.sprite_path)
+        game.screen.blits([(image, position) for position in zip(screen_x[visible].tolist(),
+                                                                 screen_y[visible].tolist())], False)
@@ -0,0 +1,99 @@
+import argparse
+import json
+import pygame
+from sys import exit
+from os.path import join, exists
+from os import makedirs
+
+from const import SCREEN_X_SIZE, SCREEN_Y_SIZE, GAME_TITLE
+
+
+class Replay:
+    """
+    Log of inputs received in every frame of the game. Consecutive
+    frames with the same inputs are kept as one run: [frames, inputs].
+    """
+    def __init__(self, runs=None):
+        self.runs = runs if runs is not None else []
+
+    def record(self, inputs):
+        """
+        Append one frame.
+        :param inputs: Tuple of inputs received in this frame.
+        """
+        if len(self.runs) != 0 and self.runs[-1][1] == inputs:
+            self.runs[-1][0] += 1
+        else:
+            self.runs.append([1, inputs])
+
+    def frames(self):
+        """
+        Generator of inputs, frame by frame.
+        """
+        for amount, inputs in self.runs:
+            for _ in range(amount):
+                yield inputs
+
+    def __len__(self):
+        return sum(amount for amount, _ in self.runs)
+
+
+def replay_path(level_number):
+    return join('..', 'replays', "%04d.json" % level_number)
+
+
+def save_replay(replay, level_number):
+    """
+    Replay is saved as JSON list of runs [frames, [inputs...]].
+    """
+    path = join('..', 'replays')
+    if not exists(path):
+        makedirs(path)
+    with open(replay_path(level_number), 'w') as file:
+        json.dump(replay.runs, file)
+
+
+def load_replay(level_number):
+    """
+    :return: Replay instance. Raises IOError if there is no saved replay.
+    """
+    with open(replay_path(level_number)) as file:
+        # Inputs are compared with tuples received by Game.step.
+        return Replay([[amount, tuple(inputs)] for amount, inputs in json.load(file)])
+
+
+def run_replay(game, replay):
+    """
+    Feed replay to the game as fast as possible, without rendering.
+    :param game: Game instance.
+    :param replay: Replay instance.
+    :return: Game stats after the last frame.
+    """
+    for inputs in replay.frames():
+        game.step(inputs)
+        game.messages.clear()
+        if game.is_won() or game.is_lost():
+            break
+    return game.stats()
+
+
+if __name__ == "__main__":
+    from game import Game
+    from images import preload_images
+
+    parser = argparse.ArgumentParser(description="Replay best result recorded for level.")
+    parser.add_argument('level', type=int, help="level number (starting from 1)")
+    parser.add_argument('--headless', action='store_true', help="run without window and frame limit")
+    args = parser.parse_args()
+    try:
+        level_replay = load_replay(args.level - 1)
+    except (OSError, ValueError) as error:
+        exit("Can't load replay of level %d: %s" % (args.level, error))
+    if args.headless:
+        print(run_replay(Game(args.level - 1), level_replay))
+    else:
+        pygame.init()
+        pygame.display.set_mode((SCREEN_X_SIZE, SCREEN_Y_SIZE))
+        preload_images('tiles', 'objects', 'hud')
+        pygame.display.set_caption(GAME_TITLE)
+        print(Game(args.level - 1).play(level_replay))
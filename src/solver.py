@@ -0,0 +1,472 @@
+from collections import deque
+from heapq import heappush, heappop
+from random import Random
+
+from const import DEFAULT_LAYER, color_to_index
+from objects import Player, Ball, Box, Diamond, Envelope, Portal, Cannon, Door, MovingObject, Event
+
+# Tiles which stop rolling ball
+STOPPING_TILES = '~RGBU'
+MAGNETIC_PADS = 'RGBU'
+# Pads counting ball of given color towards victory
+COUNTING_PADS = ('rRuU', 'gGuU', 'bBuU')
+# Objects which change the puzzle in ways which can't be modelled on the tile level
+UNSUPPORTED_OBJECTS = (Portal, Cannon, Door)
+
+
+class SearchLimitReached(Exception):
+    def __init__(self, message=None):
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+class Puzzle:
+    """
+    Level reduced to what matters on the tile level: terrain and positions of
+    objects. Cells are numbered y * width + x. Objects which move on their own
+    (enemies, cannonballs) and events are ignored, objects which never move
+    are obstacles. Levels with unsupported objects (see UNSUPPORTED_OBJECTS)
+    are not solved, names of their classes are kept in unsupported.
+    """
+    def __init__(self, level):
+        self.width = level.width + 2
+        self.height = level.height + 2
+        rows = [self.width * '#']
+        for row in level.tiles:
+            rows.append('#' + row + '#')
+        rows.append(self.width * '#')
+        self.tiles = ''.join(rows)
+        self.steps = level.steps
+        self.player = None
+        self.balls = []  # Cells of balls, sorted by color and then by cell
+        self.ball_colors = []  # Color indexes of balls
+        self.boxes = []
+        self.pickups = []  # Cells of objects disappearing on touch (diamonds, envelopes)
+        self.obstacles = set()
+        self.unsupported = sorted({type(obj).__name__ for obj in level.objects if isinstance(obj, UNSUPPORTED_OBJECTS)})
+        for obj in level.objects:
+            cell = obj.y * self.width + obj.x
+            if isinstance(obj, Player):
+                self.player = cell
+            elif isinstance(obj, Event) or obj.layer != DEFAULT_LAYER:
+                continue
+            elif isinstance(obj, Ball):
+                self.balls.append(cell)
+                self.ball_colors.append(color_to_index(obj.color))
+            elif isinstance(obj, Box):
+                self.boxes.append(cell)
+            elif isinstance(obj, (Diamond, Envelope)):
+                self.pickups.append(cell)
+            elif not isinstance(obj, MovingObject):
+                self.obstacles.add(cell)
+        balls = sorted(zip(self.ball_colors, self.balls))
+        self.ball_colors = [color for color, _ in balls]
+        self.balls = [cell for _, cell in balls]
+        self.lilies = [cell for cell, tile in enumerate(self.tiles) if tile == 'l']
+
+    def description(self):
+        """
+        :return: Tuple describing puzzle completely. Equal puzzles have equal descriptions.
+        """
+        return (self.width, self.height, self.tiles, self.steps, self.player, tuple(self.balls),
+                tuple(self.ball_colors), tuple(self.boxes), tuple(self.pickups),
+                tuple(sorted(self.obstacles)), tuple(self.unsupported))
+
+
+class TranspositionTable:
+    """
+    Table of visited states, keyed by Zobrist hash. Each entry keeps cost of
+    reaching the state and the move it was reached with. Table has limited
+    capacity, search is stopped once it is full.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = {}
+
+    def lookup(self, key):
+        """
+        :return: (cost, parent key, move) or None.
+        """
+        return self.entries.get(key)
+
+    def store(self, key, cost, parent, move):
+        if len(self.entries) >= self.capacity and key not in self.entries:
+            raise SearchLimitReached("Transposition table is full (%d states)." % self.capacity)
+        self.entries[key] = (cost, parent, move)
+
+
+class Solution:
+    def __init__(self, steps, moves, states):
+        """
+        :param steps: Steps taken by player.
+        :param moves: Directions of arrows pressed, including pushes (which don't count as steps).
+        :param states: Amount of visited states.
+        """
+        self.steps = steps
+        self.moves = moves
+        self.states = states
+
+
+class Unsupported:
+    def __init__(self, objects):
+        """
+        Result of puzzles which can't be solved on the tile level.
+        :param objects: Names of classes of unsupported objects in puzzle.
+        """
+        self.objects = objects
+
+
+class Solver:
+    """
+    Search for solution with the least amount of steps. Touching objects
+    doesn't count as step, player's position matters only when he touches
+    something, so only states right after touches are searched. State is tuple:
+    (player, balls, boxes, pickups, lilies, occupied), where balls and boxes
+    are tuples of cells (None for drowned box, balls of the same color are
+    sorted, so their order doesn't matter), pickups is bitmask of collected
+    pickups, lilies is bitmask of drowned lilies and occupied is bitmask of
+    cells of balls and boxes (it is updated with every move, instead of being
+    built again for every state).
+    """
+    def __init__(self, puzzle, capacity=1000000, seed=0):
+        self.puzzle = puzzle
+        self.capacity = capacity
+        self.offsets = {
+            'up': -puzzle.width,
+            'down': puzzle.width,
+            'left': -1,
+            'right': 1,
+        }
+        self.lily_index = {cell: i for i, cell in enumerate(puzzle.lilies)}
+        self.pickup_index = {cell: i for i, cell in enumerate(puzzle.pickups)}
+        # Moves to neighbours which are not walls, for every cell
+        self.neighbours = [[(move, cell + offset) for move, offset in self.offsets.items()
+                            if puzzle.tiles[cell + offset] != '#'] if tile != '#' else []
+                           for cell, tile in enumerate(puzzle.tiles)]
+        # Objects which don't change during search
+        self.static_cells = {cell: 'obstacle' for cell in puzzle.obstacles}
+        # Cells where player can walk when there is no ball or box (they don't change during search)
+        self.plain_cells = {cell for cell, tile in enumerate(puzzle.tiles) if tile not in '#_l' and
+                            cell not in self.static_cells and cell not in self.pickup_index}
+        # Range of indexes of balls with the same color as ball with given index
+        self.color_ranges = [(puzzle.ball_colors.index(color), len(puzzle.ball_colors) -
+                              puzzle.ball_colors[::-1].index(color)) for color in puzzle.ball_colors]
+        self.dead_cells = [self.find_dead_cells(color) for color in range(3)]
+        self.approaches = {}  # Cell: result of approach_steps, computed when it is needed
+        # Zobrist keys
+        size = len(puzzle.tiles)
+        random = Random(seed)
+        self.player_keys = [random.getrandbits(64) for _ in range(size)]
+        self.ball_keys = [[random.getrandbits(64) for _ in range(size)] for _ in range(3)]
+        self.box_keys = [random.getrandbits(64) for _ in range(size)]
+        self.pickup_keys = [random.getrandbits(64) for _ in puzzle.pickups]
+        self.lily_keys = [random.getrandbits(64) for _ in puzzle.lilies]
+
+    def tile(self, cell, lilies):
+        tile = self.puzzle.tiles[cell]
+        if tile == 'l' and lilies >> self.lily_index[cell] & 1:
+            return '_'
+        return tile
+
+    def find_dead_cells(self, color):
+        """
+        Ball of color in dead cell can never get to a pad counting it. Ball can be
+        pushed only by player standing behind it, so e.g. ball at wall can't
+        move away from it. Search goes back from pads and it allows more than
+        ball can do (stopping anywhere, player standing anywhere except wall
+        and water), so cells which are found dead are surely dead.
+        :param color: Color index.
+        :return: Set of cells.
+        """
+        tiles = self.puzzle.tiles
+        alive = {cell for cell, tile in enumerate(tiles) if tile in COUNTING_PADS[color]}
+        queue = deque(alive)
+        while len(queue) != 0:
+            cell = queue.popleft()
+            for offset in self.offsets.values():
+                # Ball could have rolled to cell from any cell behind it (up to wall).
+                start = cell - offset
+                while tiles[start] != '#':
+                    if (start not in alive and tiles[start] not in MAGNETIC_PADS and
+                            tiles[start - offset] not in '#_'):
+                        alive.add(start)
+                        queue.append(start)
+                    start -= offset
+        return {cell for cell, tile in enumerate(tiles) if tile != '#' and cell not in alive}
+
+    def hash(self, state):
+        player, balls, boxes, pickups, lilies, _ = state
+        key = self.player_keys[player]
+        for cell, color in zip(balls, self.puzzle.ball_colors):
+            key ^= self.ball_keys[color][cell]
+        for cell in boxes:
+            if cell is not None:
+                key ^= self.box_keys[cell]
+        for i in range(len(self.pickup_keys)):
+            if pickups >> i & 1:
+                key ^= self.pickup_keys[i]
+        for i in range(len(self.lily_keys)):
+            if lilies >> i & 1:
+                key ^= self.lily_keys[i]
+        return key
+
+    def approach_steps(self, cell):
+        """
+        Player has to get next to ball to push it. Steps are counted as if there were
+        no balls, boxes and pickups and no lily has drowned, so they are never more than real steps.
+        :param cell: Cell of ball.
+        :return: List of steps needed to get next to cell, from every cell (None if it is impossible).
+        """
+        approach = self.approaches.get(cell)
+        if approach is not None:
+            return approach
+        tiles = self.puzzle.tiles
+        approach = [None] * len(tiles)
+        queue = deque()
+        for _, neighbour in self.neighbours[cell]:
+            if tiles[neighbour] != '_' and neighbour not in self.static_cells:
+                approach[neighbour] = 0
+                queue.append(neighbour)
+        while len(queue) != 0:
+            position = queue.popleft()
+            for _, previous in self.neighbours[position]:
+                if approach[previous] is None and tiles[previous] != '_' and previous not in self.static_cells:
+                    approach[previous] = approach[position] + 1
+                    queue.append(previous)
+        self.approaches[cell] = approach
+        return approach
+
+    def lower_bound(self, state):
+        """
+        Every ball which is not on a pad has to be pushed, so player has to get next to it.
+        :return: Lower bound of steps needed to solve state, None if it can't be solved.
+        """
+        bound = 0
+        for cell, color in zip(state[1], self.puzzle.ball_colors):
+            if self.puzzle.tiles[cell] not in COUNTING_PADS[color]:
+                steps = self.approach_steps(cell)[state[0]]
+                if steps is None:
+                    return None
+                bound = max(bound, steps)
+        return bound
+
+    def is_solved(self, state):
+        for cell, color in zip(state[1], self.puzzle.ball_colors):
+            if self.puzzle.tiles[cell] not in COUNTING_PADS[color]:
+                return False
+        return True
+
+    def object_at(self, cell, balls, boxes, pickups, occupied):
+        """
+        :return: (kind, index) of object in cell, or (None, None) if there is nothing.
+        """
+        if occupied >> cell & 1:
+            if cell in balls:
+                return 'ball', balls.index(cell)
+            return 'box', boxes.index(cell)
+        index = self.pickup_index.get(cell)
+        if index is not None and not pickups >> index & 1:
+            return 'pickup', index
+        return self.static_cells.get(cell), None
+
+    def is_free(self, cell, pickups, occupied):
+        """
+        :return: True if there is no object and no wall in cell.
+        """
+        if occupied >> cell & 1 or cell in self.static_cells or self.puzzle.tiles[cell] == '#':
+            return False
+        index = self.pickup_index.get(cell)
+        return index is None or pickups >> index & 1 == 1
+
+    def walk(self, state):
+        """
+        Find shortest walks of player (without touching any object) to all reachable cells.
+        :return: (walks, touches), where walks is dictionary cell: (steps, previous cell, move)
+                 and touches is list of (cell, move) - moves touching ball, box or pickup.
+        """
+        player, _, _, pickups, lilies, occupied = state
+        walks = {player: (0, None, None)}
+        touches = []
+        queue = deque([player])
+        while len(queue) != 0:
+            cell = queue.popleft()
+            steps = walks[cell][0] + 1
+            for move, target in self.neighbours[cell]:
+                if target in walks:
+                    continue
+                # Same as object_at and tile, but this is the hottest loop of search.
+                if target in self.plain_cells:
+                    if occupied >> target & 1:
+                        touches.append((cell, move))
+                    else:
+                        walks[target] = (steps, cell, move)
+                        queue.append(target)
+                    continue
+                index = self.pickup_index.get(target)
+                if occupied >> target & 1 or (index is not None and not pickups >> index & 1):
+                    touches.append((cell, move))
+                    continue
+                if target in self.static_cells or self.tile(target, lilies) == '_':
+                    continue
+                walks[target] = (steps, cell, move)
+                queue.append(target)
+        return walks, touches
+
+    def touch(self, state, key, move):
+        """
+        Player touches object next to him (pushes ball or box, or collects pickup). It doesn't count as step.
+        :return: (state, key) after touch, or None if touch changes nothing or ball can't get to a pad after it.
+        """
+        player, balls, boxes, pickups, lilies, occupied = state
+        offset = self.offsets[move]
+        target = player + offset
+        kind, index = self.object_at(target, balls, boxes, pickups, occupied)
+        if kind == 'ball':
+            if self.puzzle.tiles[target] in MAGNETIC_PADS:
+                return None  # Can't move away from magnetic pads.
+            cell = target
+            while True:
+                following = cell + offset
+                if following == player or not self.is_free(following, pickups, occupied):
+                    break
+                cell = following
+                if self.puzzle.tiles[cell] in STOPPING_TILES:
+                    break
+            color = self.puzzle.ball_colors[index]
+            if cell == target or cell in self.dead_cells[color]:
+                return None
+            start, end = self.color_ranges[index]
+            if end - start == 1:
+                new_balls = balls[:index] + (cell,) + balls[index + 1:]
+            else:
+                group = sorted(balls[start:index] + (cell,) + balls[index + 1:end])
+                new_balls = balls[:start] + tuple(group) + balls[end:]
+            color_keys = self.ball_keys[color]
+            return ((player, new_balls, boxes, pickups, lilies, occupied ^ (1 << target | 1 << cell)),
+                    key ^ color_keys[target] ^ color_keys[cell])
+        if kind == 'box':
+            cell = target + offset
+            if not self.is_free(cell, pickups, occupied):
+                return None
+            new_key = key ^ self.box_keys[target]
+            new_lilies = lilies
+            new_occupied = occupied ^ 1 << target
+            tile = self.tile(cell, lilies)
+            if tile == 'l':
+                # Box and lily drown.
+                new_lilies |= 1 << self.lily_index[cell]
+                new_key ^= self.lily_keys[self.lily_index[cell]]
+                cell = None
+            elif tile == '_':
+                cell = None  # Box drowns.
+            else:
+                new_key ^= self.box_keys[cell]
+                new_occupied |= 1 << cell
+            new_boxes = boxes[:index] + (cell,) + boxes[index + 1:]
+            return (player, balls, new_boxes, pickups, new_lilies, new_occupied), new_key
+        if kind == 'pickup':
+            return (player, balls, boxes, pickups | 1 << index, lilies, occupied), key ^ self.pickup_keys[index]
+        return None
+
+    def move_player(self, state, key, cell):
+        """
+        :return: (state, key) with player moved to cell.
+        """
+        return (cell,) + state[1:], key ^ self.player_keys[state[0]] ^ self.player_keys[cell]
+
+    def expand(self, state, key):
+        """
+        Generator of successors of state. Player walks to some object and touches it,
+        so only states right after touches are kept (player's walks are found by BFS).
+        :return: (steps, cell, move, state, key) for every touch changing state,
+                 where steps is amount of steps to cell from which object is touched with move.
+        """
+        walks, touches = self.walk(state)
+        for cell, move in touches:
+            touched = self.touch(*self.move_player(state, key, cell), move)
+            if touched is not None:
+                yield (walks[cell][0], cell, move) + touched
+
+    def solve(self):
+        """
+        A* search over states right after touches, with lower_bound as heuristic.
+        :return: Solution, Unsupported or None if puzzle can't be solved.
+        Raises SearchLimitReached if transposition table gets full.
+        """
+        if len(self.puzzle.unsupported) != 0:
+            return Unsupported(self.puzzle.unsupported)
+        start, start_key = self.start()
+        for cell, color in zip(self.puzzle.balls, self.puzzle.ball_colors):
+            if cell in self.dead_cells[color]:
+                return None
+        bound = self.lower_bound(start)
+        if bound is None:
+            return None
+        table = TranspositionTable(self.capacity)
+        table.store(start_key, 0, None, None)
+        queue = [(bound, 0, 0, start, start_key)]
+        count = 1  # Keeps order of states with the same estimate, so states are never compared.
+        while len(queue) != 0:
+            _, _, cost, state, key = heappop(queue)
+            if table.lookup(key)[0] < cost:
+                continue  # State has been reached cheaper in the meantime.
+            if self.is_solved(state):
+                return Solution(cost, self.moves(table, key), len(table.entries))
+            for steps, cell, move, new_state, new_key in self.expand(state, key):
+                new_cost = cost + steps
+                entry = table.lookup(new_key)
+                if entry is not None and entry[0] <= new_cost:
+                    continue
+                bound = self.lower_bound(new_state)
+                if bound is None:
+                    continue
+                table.store(new_key, new_cost, key, (cell, move))
+                heappush(queue, (new_cost + bound, count, new_cost, new_state, new_key))
+                count += 1
+        return None
+
+    def start(self):
+        """
+        :return: (state, key) of puzzle's start.
+        """
+        occupied = 0
+        for cell in self.puzzle.balls + self.puzzle.boxes:
+            occupied |= 1 << cell
+        state = (self.puzzle.player, tuple(self.puzzle.balls), tuple(self.puzzle.boxes), 0, 0, occupied)
+        return state, self.hash(state)
+
+    def moves(self, table, key):
+        """
+        Table keeps only touches, so walks between them are found again, going from the start.
+        :return: List of directions of all moves.
+        """
+        touches = []
+        _, parent, touch = table.lookup(key)
+        while parent is not None:
+            touches.append(touch)
+            _, parent, touch = table.lookup(parent)
+        touches.reverse()
+        state, key = self.start()
+        moves = []
+        for cell, move in touches:
+            walks, _ = self.walk(state)
+            walk = []
+            position = cell
+            while position != state[0]:
+                _, position, step = walks[position]
+                walk.append(step)
+            moves.extend(reversed(walk))
+            moves.append(move)
+            state, key = self.touch(*self.move_player(state, key, cell), move)
+        return moves
+
+
+def solve_level(level, capacity=1000000):
+    """
+    :param level: Level instance.
+    :param capacity: Maximal amount of visited states.
+    :return: Solution, Unsupported or None.
+    """
+    return Solver(Puzzle(level), capacity).solve()
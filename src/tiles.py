@@ -1,11 +1,24 @@
+import pygame
 from os.path import join
 
 from images import get_image
+from const import TILE_SIZE
+
+# Codes of tiles' signs, as they are kept in TilesMap.cells.
+WALL = ord('#')
+WATER = ord('_')
+SAND = ord('~')
+LILY = ord('l')
+UNIVERSAL_PAD = ord('u')
+UNIVERSAL_MAGNETIC_PAD = ord('U')
+PADS = {'red': ord('r'), 'green': ord('g'), 'blue': ord('b')}  # Pad of each ball's color
+MAGNETIC_PADS = {'red': ord('R'), 'green': ord('G'), 'blue': ord('B')}
+ANY_MAGNETIC_PAD = frozenset(MAGNETIC_PADS.values()) | {UNIVERSAL_MAGNETIC_PAD}
 
 
 class TilesManager:
     def __init__(self):
-        self.__tiles_map = {
+        signs = {
             '#': get_image(join('tiles', 'wall.png')),
             '.': get_image(join('tiles', 'grass.png')),
             '_': get_image(join('tiles', 'water.png')),
@@ -20,6 +33,85 @@ class TilesManager:
             'B': get_image(join('tiles', 'blue_pad_mag.png')),
             'U': get_image(join('tiles', 'universal_pad_mag.png')),
         }
+        self.__tiles_map = {ord(sign): image for sign, image in signs.items()}
+
+    def get_tile(self, code):
+        """
+        :param code: Code of tile's sign.
+        :return: Image of tile.
+        """
+        return self.__tiles_map[code]
+
+
+class TilesMap:
+    """
+    Mutable grid of tiles. All tiles are kept in one flat bytearray, row after row.
+    Tiles are read as codes of their signs (compared with WALL, WATER, ...), so no string is built.
+    """
+    def __init__(self, rows):
+        """
+        :param rows: List of strings of the same length.
+        """
+        self.width = len(rows[0])
+        self.height = len(rows)
+        self.cells = bytearray(''.join(rows), 'ascii')
+
+    def get(self, x, y):
+        """
+        :param x, y: Coordinates.
+        :return: Code of tile's sign.
+        """
+        return self.cells[y * self.width + x]
+
+    def set(self, x, y, sign):
+        """
+        Change tile. Use Game.set_tile instead, so listeners are notified.
+        :param x, y: Coordinates.
+        :param sign: New tile.
+        """
+        self.cells[y * self.width + x] = ord(sign)
+
+
+class TilesSurface:
+    """
+    Whole terrain rendered once into an offscreen surface. Tiles which
+    change need to be invalidated - they are redrawn right before next render.
+    """
+    def __init__(self, tiles_map, tiles_manager):
+        """
+        :param tiles_map: TilesMap instance.
+        :param tiles_manager: TilesManager instance.
+        """
+        self.tiles_map = tiles_map
+        self.tiles_manager = tiles_manager
+        self.surface = pygame.Surface((tiles_map.width * TILE_SIZE, tiles_map.height * TILE_SIZE))
+        self.dirty_tiles = set()
+        for y in range(tiles_map.height):
+            for x in range(tiles_map.width):
+                self.draw_tile(x, y)
+
+    def draw_tile(self, x, y):
+        rect = pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+        self.surface.fill((0, 0, 0), rect)
+        self.surface.blit(self.tiles_manager.get_tile(self.tiles_map.get(x, y)), rect)
+
+    def invalidate(self, x, y):
+        """
+        Mark tile as changed.
+        :param x, y: Coordinates.
+        """
+        self.dirty_tiles.add((x, y))
 
-    def get_tile(self, sign):
-        return self.__tiles_map[sign]
+    def render(self, screen, position, first_x, last_x, first_y, last_y):
+        """
+        Blit window of tiles to the screen.
+        :param screen: Surface to render on.
+        :param position: Screen coordinates of tile (first_x, first_y).
+        :param first_x, last_x, first_y, last_y: Ranges of tiles' coordinates (last ones excluded).
+        """
+        for x, y in self.dirty_tiles:
+            self.draw_tile(x, y)
+        self.dirty_tiles.clear()
+        area = pygame.Rect(first_x * TILE_SIZE, first_y * TILE_SIZE,
+                           (last_x - first_x) * TILE_SIZE, (last_y - first_y) * TILE_SIZE)
+        screen.blit(self.surface, position, area)